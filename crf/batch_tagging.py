@@ -0,0 +1,105 @@
+"""
+Tagging of many sequences with a trained pycrfsuite model in a pool of processes.
+Every worker opens the model once, sequences are sent to workers in chunks
+and predictions come back in input order.
+Works also for sklearn_crfsuite models, with model file crf.modelfile.name
+and features from extract_features_dict, and for pruned CompactCRF .npz models
+of crf_compact.py, with feature string lists.
+use example:
+with BatchTagger('crf.model') as tagger:
+    y_pred = tagger.tag([X.sequence(i) for i in test_indices])
+    print(tagger.stats())
+python batch_tagging.py crf.model features.npz --workers 4 --output tags.txt
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from crf_compact import open_tagger
+from feature_store import FeatureStore
+
+_tagger = None
+
+
+def _open_tagger(model_file):
+    #pool initializer, tagger stays open for the lifetime of the worker
+    global _tagger
+    _tagger = open_tagger(model_file)
+
+
+def _tag(xseq):
+    return _tagger.tag(xseq)
+
+
+class BatchTagger():
+
+    def __init__(self, model_file, workers=None, chunksize=None):
+        """
+        Opens model_file (pycrfsuite or CompactCRF .npz) in workers processes
+        (all cores by default), workers=1 tags in the calling process.
+        """
+        self.workers = workers or os.cpu_count()
+        self.chunksize = chunksize
+        self.sequences = 0
+        self.tokens = 0
+        self.elapsed = 0.0
+        if self.workers == 1:
+            self.pool = None
+            self.tagger = open_tagger(model_file)
+        else:
+            self.pool = multiprocessing.Pool(self.workers, initializer=_open_tagger, initargs=(model_file,))
+
+    def tag(self, xseqs):
+        """
+        Returns list of predicted labels for every sequence of xseqs, in order.
+        Sequence is a list of token features (lists of strings or dicts).
+        """
+        xseqs = list(xseqs)
+        start = time.perf_counter()
+        if self.pool is None:
+            y_pred = [self.tagger.tag(xseq) for xseq in xseqs]
+        else:
+            chunksize = self.chunksize or max(1, len(xseqs) // (self.workers * 4))
+            y_pred = self.pool.map(_tag, xseqs, chunksize)
+        self.elapsed += time.perf_counter() - start
+        self.sequences += len(xseqs)
+        self.tokens += sum(len(yseq) for yseq in y_pred)
+        return y_pred
+
+    def stats(self):
+        return "Sequences: %d, tokens: %d, %.0f sequences/s, %.0f tokens/s" % (
+            self.sequences, self.tokens,
+            self.sequences / self.elapsed if self.elapsed else 0,
+            self.tokens / self.elapsed if self.elapsed else 0)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        else:
+            self.tagger.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tag sequences of FeatureStore file with CRF model.')
+    parser.add_argument('model', help='pycrfsuite model file or CompactCRF .npz file')
+    parser.add_argument('features', help='FeatureStore .npz file')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--output', default=None, help='file for predicted labels, one sequence per line')
+    args = parser.parse_args()
+
+    store = FeatureStore.load(args.features)
+    with BatchTagger(args.model, workers=args.workers) as tagger:
+        y_pred = tagger.tag(store.sequence(i) for i in range(len(store)))
+        print(tagger.stats())
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for yseq in y_pred:
+                f.write(' '.join(yseq) + '\n')
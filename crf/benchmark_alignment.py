@@ -0,0 +1,50 @@
+"""
+Compares span based named entity labels (NKJPCorpus_Document.named_tags)
+with the old labelling, which for every word scanned all entity tokens
+of the document for the same surface form.
+use example:
+python benchmark_alignment.py NKJP-PodkorpusMilionowy-1.2
+"""
+import re
+import sys
+import time
+
+from nkjp_download import NKJPCorpusReader
+
+
+def scan_labels(document, outside='I'):
+    named_data = []
+    for named, name in document.named_entities():
+        for val in re.split(r'\s+', named):
+            named_data.append((val, name))
+    return [next((name for ind, (named, name) in enumerate(named_data) if named == word), outside)
+            for word, tag in document.tagged_words()]
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else 'NKJP-PodkorpusMilionowy-1.2'
+    documents = NKJPCorpusReader(root=root).documents()
+
+    start = time.perf_counter()
+    scanned = [scan_labels(document) for document in documents]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aligned = [document.named_tags(scheme='IO', outside='I') for document in documents]
+    align_time = time.perf_counter() - start
+
+    words = sum(len(labels) for labels in aligned)
+    entity_words = sum(label != 'I' for labels in aligned for label in labels)
+    # words the old labelling marked only because the same form was an entity elsewhere
+    spurious = sum(old != 'I' and new == 'I'
+                   for old_labels, new_labels in zip(scanned, aligned)
+                   for old, new in zip(old_labels, new_labels))
+    differ = sum(old != new
+                 for old_labels, new_labels in zip(scanned, aligned)
+                 for old, new in zip(old_labels, new_labels))
+
+    print("Documents: %d, words: %d, entity words: %d" % (len(documents), words, entity_words))
+    print("Linear scan:    %.2fs" % scan_time)
+    print("Span alignment: %.2fs" % align_time)
+    print("Speedup: %.2fx" % (scan_time / align_time))
+    print("Labels differing: %d (%d words labelled by surface form only)" % (differ, spurious))
@@ -0,0 +1,47 @@
+"""
+Compares per token word2features / word2features_dict with document level
+extract_features / extract_features_dict. Both must give the same features.
+Expects pickled list of documents, each a list of (word, postag, label),
+as written by nkjp_download.py.
+use example:
+python benchmark_features.py word_data_file.obj
+"""
+import gc
+import pickle
+import sys
+import time
+
+from features import word2features, word2features_dict, extract_features, extract_features_dict
+
+
+def run(extract, data, repeat=3):
+    #best of repeat runs with garbage collector off, as in timeit
+    times = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            features = [extract(doc) for doc in data]
+            times.append(time.perf_counter() - start)
+            del features
+        features = [extract(doc) for doc in data]
+    finally:
+        gc.enable()
+    return features, min(times)
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1] if len(sys.argv) > 1 else 'word_data_file.obj', 'rb') as infile:
+        data = pickle.load(infile)
+    tokens = sum(len(doc) for doc in data)
+    print("Documents: %d, tokens: %d" % (len(data), tokens))
+
+    for name, token_template, extract in [
+            ('list (pycrfsuite)', word2features, extract_features),
+            ('dict (sklearn_crfsuite)', word2features_dict, extract_features_dict)]:
+        per_token, per_token_time = run(lambda doc: [token_template(doc, i) for i in range(len(doc))], data)
+        per_doc, per_doc_time = run(extract, data)
+        if per_token != per_doc:
+            raise AssertionError('%s features differ' % name)
+        print("%s: per token %.2fs, per document %.2fs, speedup %.2fx"
+              % (name, per_token_time, per_doc_time, per_token_time / per_doc_time))
@@ -0,0 +1,85 @@
+"""
+Compares loading reuters.xml with BeautifulSoup/html5lib (old crf_test.py)
+and with streaming reuters_corpus.iter_documents on a copy of the file
+with all documents repeated scale times. Both must give the same documents.
+use example:
+python benchmark_reuters.py reuters.xml 20
+"""
+import codecs
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup as bs
+from bs4.element import Tag
+
+from reuters_corpus import iter_documents
+
+
+def soup_documents(filename):
+    with codecs.open(filename, "r", "utf-8") as infile:
+        soup = bs(infile, "html5lib")
+
+    docs = []
+    for elem in soup.find_all("document"):
+        texts = []
+        for c in elem.find("textwithnamedentities").children:
+            if type(c) == Tag:
+                if c.name == "namedentityintext":
+                    label = "N"  # part of a named entity
+                else:
+                    label = "I"  # irrelevant word
+                for w in c.text.split(" "):
+                    if len(w) > 0:
+                        texts.append((w, label))
+        docs.append(texts)
+    return docs
+
+
+def write_scaled(filename, scale):
+    #copy of the file with the documents repeated scale times
+    with open(filename, encoding='utf-8') as f:
+        content = f.read()
+    begin = re.search(r'<Document[\s>]', content).start()
+    end = content.rindex('</Document>') + len('</Document>')
+    scaled = tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.xml', delete=False)
+    with scaled:
+        scaled.write(content[:begin])
+        for _ in range(scale):
+            scaled.write(content[begin:end])
+        scaled.write(content[end:])
+    return scaled.name
+
+
+def run(load, filename):
+    #time and peak memory of loading all documents
+    tracemalloc.start()
+    start = time.perf_counter()
+    docs = load(filename)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return docs, elapsed, peak
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'reuters.xml'
+    scale = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    scaled = write_scaled(filename, scale)
+    try:
+        print("File: %s x %d, %.1f MB" % (filename, scale, os.path.getsize(scaled) / 2 ** 20))
+        # streaming loader is consumed one document at a time, as in crf_test.py
+        streamed, stream_time, stream_peak = run(
+            lambda name: [doc for doc in iter_documents(name)], scaled)
+        souped, soup_time, soup_peak = run(soup_documents, scaled)
+    finally:
+        os.remove(scaled)
+    if souped != streamed:
+        raise AssertionError('documents differ')
+    print("Documents: %d, words: %d" % (len(streamed), sum(len(doc) for doc in streamed)))
+    print("bs4/html5lib: %.2fs, peak memory %.1f MB" % (soup_time, soup_peak / 2 ** 20))
+    print("iterparse:    %.2fs, peak memory %.1f MB" % (stream_time, stream_peak / 2 ** 20))
+    print("Speedup: %.2fx" % (soup_time / stream_time))
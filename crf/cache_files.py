@@ -0,0 +1,49 @@
+"""
+Common parts of the on-disk caches (NKJPCorpus_Cache, FeatureCache, PosTagCache).
+atomic_write writes a cache file through a temporary .tmp file in the same
+directory, so other processes see either the old or the complete new file.
+CacheCounter counts hits and misses of a cache.
+use example:
+atomic_write('feature_cache/key.npz', store.save)
+class FeatureCache(CacheCounter):
+    ...
+cache.record(hit)
+print(cache.stats())
+"""
+import os
+import tempfile
+
+TMP_SUFFIX = '.tmp'
+
+
+def atomic_write(filename, write):
+    """
+    Calls write(file) on a temporary file opened in binary mode and renames it to filename.
+    """
+    write_file = tempfile.NamedTemporaryFile(delete=False, dir=os.path.dirname(os.path.abspath(filename)),
+                                             suffix=TMP_SUFFIX)
+    try:
+        with write_file:
+            write(write_file)
+        os.replace(write_file.name, filename)
+    except BaseException:
+        if os.path.exists(write_file.name):
+            os.remove(write_file.name)
+        raise
+
+
+class CacheCounter():
+
+    def __init__(self, name='Cache'):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        return "%s hits: %d, misses: %d" % (self.name, self.hits, self.misses)
@@ -0,0 +1,174 @@
+"""
+Columnar corpus format replacing pickled word_data_file.obj.
+
+A corpus directory holds:
+vocab.json - lists of words, ctags and labels, list index is the id
+word_ids.npy, ctag_ids.npy, label_ids.npy - ids of all tokens, document after document
+doc_offsets.npy - token offset of every document (number of documents + 1 values)
+sent_offsets.npy - token offset of every sentence (number of sentences + 1 values)
+doc_sents.npy - sentence offset of every document (number of documents + 1 values)
+
+Arrays are memory mapped on load, so opening a corpus does not depend on its size
+and any document can be read without touching the others.
+use example:
+python corpus_columns.py word_data_file.obj word_data_columns
+corpus = ColumnCorpus('word_data_columns')
+corpus[10]  # [(word, ctag, label), ...] as in word_data_file.obj
+"""
+import json
+import os
+import pickle
+import sys
+from array import array
+
+import numpy as np
+
+ARRAYS = ('word_ids', 'ctag_ids', 'label_ids', 'doc_offsets', 'sent_offsets', 'doc_sents')
+
+
+class Vocabulary():
+    """
+    Interns strings as consecutive integer ids.
+    """
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.ids = {item: id for id, item in enumerate(self.items)}
+
+    def get_id(self, item):
+        id = self.ids.get(item)
+        if id is None:
+            id = self.ids[item] = len(self.items)
+            self.items.append(item)
+        return id
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _save_ids(directory, name, ids, size):
+    #smallest unsigned type able to hold ids below size
+    np.save(os.path.join(directory, name + '.npy'),
+            np.frombuffer(ids, dtype=np.int64).astype(np.min_scalar_type(max(size - 1, 0))))
+
+
+class ColumnWriter():
+    """
+    Writes corpus document by document, keeping only integer ids in memory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.vocab = {'words': Vocabulary(), 'ctags': Vocabulary(), 'labels': Vocabulary()}
+        self.ids = {name: array('q') for name in ARRAYS}
+        for name in ('doc_offsets', 'sent_offsets', 'doc_sents'):
+            self.ids[name].append(0)
+
+    def append(self, word_data, sents=None):
+        """
+        Adds document: list of (word, ctag, label) and its sentence
+        (begin, end) boundaries. Without sents document is one sentence.
+        """
+        ids = self.ids
+        offset = ids['doc_offsets'][-1]
+        for word, tag, label in word_data:
+            ids['word_ids'].append(self.vocab['words'].get_id(word))
+            ids['ctag_ids'].append(self.vocab['ctags'].get_id(tag))
+            ids['label_ids'].append(self.vocab['labels'].get_id(label))
+        for begin, end in (sents if sents is not None else [(0, len(word_data))]):
+            ids['sent_offsets'].append(offset + end)
+        ids['doc_offsets'].append(offset + len(word_data))
+        ids['doc_sents'].append(len(ids['sent_offsets']) - 1)
+
+    def close(self):
+        with open(os.path.join(self.directory, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump({name: vocabulary.items for name, vocabulary in self.vocab.items()}, f,
+                      ensure_ascii=False)
+        _save_ids(self.directory, 'word_ids', self.ids['word_ids'], len(self.vocab['words']))
+        _save_ids(self.directory, 'ctag_ids', self.ids['ctag_ids'], len(self.vocab['ctags']))
+        _save_ids(self.directory, 'label_ids', self.ids['label_ids'], len(self.vocab['labels']))
+        for name in ('doc_offsets', 'sent_offsets', 'doc_sents'):
+            np.save(os.path.join(self.directory, name + '.npy'),
+                    np.frombuffer(self.ids[name], dtype=np.int64))
+
+
+def write_columns(directory, documents):
+    """
+    Writes corpus from documents: lists of (word, ctag, label).
+    """
+    writer = ColumnWriter(directory)
+    for word_data in documents:
+        writer.append(word_data)
+    writer.close()
+
+
+def convert_pickle(pickle_file, directory):
+    """
+    Converts pickled word_data_file.obj (list of documents,
+    each a list of (word, ctag, label)) to columnar corpus.
+    """
+    with open(pickle_file, 'rb') as infile:
+        data = pickle.load(infile)
+    write_columns(directory, data)
+
+
+class ColumnCorpus():
+    """
+    Read only access to corpus written by write_columns.
+    Behaves like list of documents loaded from word_data_file.obj.
+    """
+
+    def __init__(self, directory, mmap=True):
+        self.directory = directory
+        with open(os.path.join(directory, 'vocab.json'), encoding='utf-8') as f:
+            vocab = json.load(f)
+        self.words = vocab['words']
+        self.ctags = vocab['ctags']
+        self.labels = vocab['labels']
+        mmap_mode = 'r' if mmap else None
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def document_ids(self, index):
+        """
+        Returns (word ids, ctag ids, label ids) arrays of document.
+        """
+        begin, end = self.doc_offsets[index], self.doc_offsets[index + 1]
+        return self.word_ids[begin:end], self.ctag_ids[begin:end], self.label_ids[begin:end]
+
+    def sents(self, index):
+        """
+        Returns (begin, end) sentence boundaries of document, relative to its first token.
+        """
+        offsets = self.sent_offsets[self.doc_sents[index]:self.doc_sents[index + 1] + 1] \
+            - self.doc_offsets[index]
+        return [(int(begin), int(end)) for begin, end in zip(offsets[:-1], offsets[1:])]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('document index out of range')
+        word_ids, ctag_ids, label_ids = self.document_ids(index)
+        return [(self.words[word], self.ctags[tag], self.labels[label])
+                for word, tag, label in zip(word_ids.tolist(), ctag_ids.tolist(), label_ids.tolist())]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+if __name__ == "__main__":
+    pickle_file = sys.argv[1] if len(sys.argv) > 1 else 'word_data_file.obj'
+    directory = sys.argv[2] if len(sys.argv) > 2 else 'word_data_columns'
+    convert_pickle(pickle_file, directory)
+    corpus = ColumnCorpus(directory)
+    print("Documents: %d, words: %d, vocabulary: %d words, %d ctags, %d labels"
+          % (len(corpus), len(corpus.word_ids), len(corpus.words), len(corpus.ctags), len(corpus.labels)))
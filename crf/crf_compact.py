@@ -0,0 +1,252 @@
+"""
+Compaction of trained CRF models for deployment.
+State features (attribute, label) and transitions of a pycrfsuite model
+(the same as state_features_ and transition_features_ of sklearn_crfsuite.CRF)
+with absolute weight below threshold are removed, attributes left without
+features are dropped. The rest is saved to .npz and tagged with Viterbi in numpy,
+giving the same labels as pycrfsuite.Tagger for threshold 0.
+CRFsuite can not write a model from given weights, so pruned models use this format:
+the .npz files can be loaded only by CompactCRF.load, not by pycrfsuite.Tagger
+or sklearn_crfsuite.CRF. open_tagger opens either format, BatchTagger and
+ner_service.py use it, so a pruned .npz model is served like a pycrfsuite one.
+Latency of CompactCRF rows in pruning_report is comparable between thresholds,
+the pycrfsuite row comes from the C tagger, which runs Viterbi without
+interpreter overhead per token.
+use example:
+model = CompactCRF.from_model('crf.model', threshold=0.01)
+model.save('crf_compact.npz')
+model = CompactCRF.load('crf_compact.npz')
+y_pred = [model.tag(xseq) for xseq in X_test]
+tagger = open_tagger('crf_compact.npz')
+python crf_compact.py crf.model test_data.obj --thresholds 0 0.01 0.05 0.1
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pycrfsuite
+from sklearn_crfsuite import metrics
+
+from features import extract_features
+
+
+class CompactCRF():
+
+    def __init__(self, labels, attributes, attr_offsets, label_ids, weights, transitions):
+        """
+        Features of attribute i are label_ids[attr_offsets[i]:attr_offsets[i + 1]]
+        with the same slice of weights, transitions is labels x labels matrix.
+        """
+        self.labels = list(labels)
+        self.attributes = list(attributes)
+        self.attr_offsets = attr_offsets
+        self.label_ids = label_ids
+        self.weights = weights
+        self.transitions = transitions
+        self.attr_ids = {attr: id for id, attr in enumerate(self.attributes)}
+        #dense attributes x labels matrix, scores of a token are sum of its rows,
+        #last row is zero and stands for attributes unknown to the model
+        self.state = np.zeros((len(self.attributes) + 1, len(self.labels)), dtype=np.float32)
+        rows = np.repeat(np.arange(len(self.attributes)), np.diff(attr_offsets))
+        self.state[rows, label_ids] = weights
+        self._scores = None
+        self._marginals = None
+
+    @classmethod
+    def from_features(cls, state_features, transition_features, threshold=0.0):
+        """
+        Builds model from {(attribute, label): weight} and {(label_from, label_to): weight}
+        dicts, keeping weights with absolute value of at least threshold.
+        """
+        labels = sorted(set(label for attr, label in state_features)
+                        | set(label for pair in transition_features for label in pair))
+        label_index = {label: id for id, label in enumerate(labels)}
+        by_attr = {}
+        for (attr, label), weight in state_features.items():
+            if abs(weight) >= threshold and weight != 0:
+                by_attr.setdefault(attr, []).append((label_index[label], weight))
+        attributes = sorted(by_attr)
+        attr_offsets = np.zeros(len(attributes) + 1, dtype=np.int64)
+        attr_offsets[1:] = np.cumsum([len(by_attr[attr]) for attr in attributes])
+        features = [feature for attr in attributes for feature in by_attr[attr]]
+        label_ids = np.array([label for label, weight in features], dtype=np.min_scalar_type(max(len(labels) - 1, 0)))
+        weights = np.array([weight for label, weight in features], dtype=np.float32)
+        transitions = np.zeros((len(labels), len(labels)), dtype=np.float32)
+        for (label_from, label_to), weight in transition_features.items():
+            if abs(weight) >= threshold:
+                transitions[label_index[label_from], label_index[label_to]] = weight
+        return cls(labels, attributes, attr_offsets, label_ids, weights, transitions)
+
+    @classmethod
+    def from_model(cls, model_file, threshold=0.0):
+        """
+        Builds model from pycrfsuite model file (crf.model, crf.modelfile.name of sklearn_crfsuite).
+        """
+        tagger = pycrfsuite.Tagger()
+        tagger.open(model_file)
+        try:
+            info = tagger.info()
+        finally:
+            tagger.close()
+        return cls.from_features(info.state_features, info.transitions, threshold)
+
+    def __len__(self):
+        #number of state and transition features
+        return len(self.weights) + int(np.count_nonzero(self.transitions))
+
+    def save(self, filename):
+        np.savez_compressed(filename,
+                            labels=np.array(self.labels, dtype=object),
+                            attributes=np.array(self.attributes, dtype=object),
+                            attr_offsets=self.attr_offsets, label_ids=self.label_ids,
+                            weights=self.weights, transitions=self.transitions)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=True) as arrays:
+            return cls(arrays['labels'].tolist(), arrays['attributes'].tolist(), arrays['attr_offsets'],
+                       arrays['label_ids'], arrays['weights'], arrays['transitions'])
+
+    def attribute_ids(self, xseq):
+        """
+        Returns attribute ids of all features of sequence in one array (unknown
+        attributes get the zero row) and the number of features of every token.
+        """
+        get_id = self.attr_ids.get
+        zero = len(self.attributes)
+        lengths = [len(features) for features in xseq]
+        ids = [get_id(feature, zero) for features in xseq for feature in features]
+        return np.array(ids, dtype=np.intp), np.array(lengths, dtype=np.intp)
+
+    def tag(self, xseq):
+        """
+        Returns labels of sequence: list of feature string lists, one per token.
+        """
+        self._scores = self._marginals = None
+        if not len(xseq):
+            return []
+        ids, lengths = self.attribute_ids(xseq)
+        #sums of rows of every token, tokens without features keep zero scores
+        scores = np.zeros((len(lengths), len(self.labels)), dtype=np.float32)
+        np.add.at(scores, np.repeat(np.arange(len(lengths)), lengths), self.state[ids])
+        self._scores = scores
+        #Viterbi, the recursion over tokens is sequential and stays in Python
+        transitions = self.transitions
+        label_range = np.arange(len(self.labels))
+        back = []
+        best = scores[0]
+        for token_scores in scores[1:]:
+            candidates = best[:, None] + transitions
+            previous = candidates.argmax(axis=0)
+            back.append(previous)
+            best = candidates[previous, label_range] + token_scores
+        path = [int(best.argmax())]
+        for previous in reversed(back):
+            path.append(int(previous[path[-1]]))
+        return [self.labels[id] for id in reversed(path)]
+
+    def marginal(self, label, position):
+        """
+        Returns marginal probability of label at position of the sequence tagged last,
+        like pycrfsuite.Tagger.marginal.
+        """
+        if self._scores is None:
+            raise NameError('No sequence tagged!')
+        if self._marginals is None:
+            #forward-backward in log space
+            scores = self._scores.astype(np.float64)
+            transitions = self.transitions.astype(np.float64)
+            alpha = np.empty_like(scores)
+            beta = np.zeros_like(scores)
+            alpha[0] = scores[0]
+            for t in range(1, len(scores)):
+                alpha[t] = _logsumexp(alpha[t - 1][:, None] + transitions, axis=0) + scores[t]
+            for t in range(len(scores) - 2, -1, -1):
+                beta[t] = _logsumexp(transitions + (scores[t + 1] + beta[t + 1])[None, :], axis=1)
+            self._marginals = np.exp(alpha + beta - _logsumexp(alpha[-1], axis=0))
+        return float(self._marginals[position, self.labels.index(label)])
+
+    def close(self):
+        #nothing to release, for the same interface as pycrfsuite.Tagger
+        pass
+
+
+def _logsumexp(a, axis):
+    top = a.max(axis=axis, keepdims=True)
+    return np.squeeze(top, axis=axis) + np.log(np.exp(a - top).sum(axis=axis))
+
+
+def open_tagger(model_file):
+    """
+    Returns CompactCRF for .npz model_file, otherwise opened pycrfsuite.Tagger.
+    Both have tag(xseq), marginal(label, position) and close(); CompactCRF
+    tags sequences of feature string lists (extract_features, FeatureStore.sequence).
+    """
+    if model_file.endswith('.npz'):
+        return CompactCRF.load(model_file)
+    tagger = pycrfsuite.Tagger()
+    tagger.open(model_file)
+    return tagger
+
+
+def _latency(tag, xseqs):
+    #tagging time per sequence in milliseconds, and predictions
+    start = time.perf_counter()
+    y_pred = [tag(xseq) for xseq in xseqs]
+    return (time.perf_counter() - start) * 1000 / max(len(xseqs), 1), y_pred
+
+
+def pruning_report(model_file, xseqs, y_true, thresholds=(0, 0.01, 0.05, 0.1, 0.5), outside='I'):
+    """
+    Returns rows of (model, features, size in bytes, ms per sequence, weighted F1)
+    for the pycrfsuite model and its CompactCRF prunings at thresholds.
+    The first row is tagged by pycrfsuite (C), the others by CompactCRF.tag (numpy).
+    """
+    labels = sorted(set(label for yseq in y_true for label in yseq) - {outside})
+    tagger = pycrfsuite.Tagger()
+    tagger.open(model_file)
+    try:
+        features = len(tagger.info().state_features) + len(tagger.info().transitions)
+        latency, y_pred = _latency(tagger.tag, xseqs)
+    finally:
+        tagger.close()
+    rows = [('pycrfsuite', features, os.path.getsize(model_file), latency,
+             metrics.flat_f1_score(y_true, y_pred, average='weighted', labels=labels))]
+    for threshold in thresholds:
+        model = CompactCRF.from_model(model_file, threshold)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'model.npz')
+            model.save(filename)
+            size = os.path.getsize(filename)
+        latency, y_pred = _latency(model.tag, xseqs)
+        rows.append(('threshold %g' % threshold, len(model), size, latency,
+                     metrics.flat_f1_score(y_true, y_pred, average='weighted', labels=labels)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report size, latency and F1 of pruned CRF models.')
+    parser.add_argument('model', help='pycrfsuite model file')
+    parser.add_argument('data', help='pickled list of test documents, each a list of (word, postag, label)')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0, 0.01, 0.05, 0.1, 0.5])
+    parser.add_argument('--outside', default='I', help='label of words outside named entities')
+    parser.add_argument('--save', default=None,
+                        help='save model pruned at the first threshold to this .npz file (CompactCRF format, '
+                             'for batch_tagging.py and ner_service.py)')
+    args = parser.parse_args()
+
+    with open(args.data, 'rb') as infile:
+        data = pickle.load(infile)
+    xseqs = [extract_features(doc) for doc in data]
+    y_true = [[label for (word, postag, label) in doc] for doc in data]
+    print("Latency: pycrfsuite row is the C tagger, threshold rows are the numpy CompactCRF tagger,")
+    print("compare the effect of pruning between threshold rows only. Pruned .npz models")
+    print("are not pycrfsuite files, serve them with batch_tagging.py or ner_service.py.")
+    print("%-16s %10s %10s %12s %8s" % ('model', 'features', 'size (KB)', 'ms/sequence', 'F1'))
+    for name, features, size, latency, f1 in pruning_report(args.model, xseqs, y_true, args.thresholds, args.outside):
+        print("%-16s %10d %10.1f %12.3f %8.4f" % (name, features, size / 1024, latency, f1))
+    if args.save:
+        CompactCRF.from_model(args.model, args.thresholds[0]).save(args.save)
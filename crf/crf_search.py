@@ -0,0 +1,250 @@
+"""
+Hyperparameter search over c1/c2 of sklearn_crfsuite.CRF without copying
+the training data to every worker.
+Features are extracted once and saved by write_search_data as memory mapped
+arrays (FeatureStore.save_arrays plus label ids), with a FeatureCache they are
+loaded from the cache of earlier runs and crf_test.py. Every worker maps them when
+it starts and gets only parameters and fold indices, instead of the pickled
+X_train that RandomizedSearchCV sends for every candidate.
+Results are kept in grid_scores_ like in old RandomizedSearchCV, so the
+notebook scatter plot cells work unchanged.
+Features come from the dict template of the NKJP notebooks (extract_features_dict,
+word2features_dict) by default, --template list uses extract_features of crf_test.py.
+fit_halving is successive halving: all candidates are trained briefly on part
+of the data, only the best 1/factor of them get more iterations and data.
+use example:
+write_search_data('search_data', data)  # or data, extract=extract_features
+write_search_data('search_data', data, cache=FeatureCache('feature_cache'))
+rs = CRFSearch('search_data', {'algorithm': 'lbfgs', 'max_iterations': 100,
+                               'all_possible_transitions': True}, cv=3)
+rs.fit(sample_candidates(30))
+print(rs.best_params_, rs.best_score_)
+print(rs.rss_stats())
+rs.fit_halving(sample_candidates(30), factor=3)
+python crf_search.py word_data_file.obj --template dict --n-iter 30 --halving --cache feature_cache
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+from collections import namedtuple
+
+import numpy as np
+import scipy.stats
+import sklearn_crfsuite
+from sklearn.model_selection import KFold
+from sklearn_crfsuite import metrics
+
+from corpus_columns import Vocabulary
+from feature_cache import FeatureCache
+from feature_store import FeatureStore
+from features import extract_features, extract_features_dict
+
+TEMPLATES = {'dict': extract_features_dict, 'list': extract_features}
+
+CVScore = namedtuple('CVScore', ['parameters', 'mean_validation_score', 'cv_validation_scores'])
+
+_store = None
+_labels = None
+
+
+def write_search_data(directory, data, extract=extract_features_dict, workers=None, cache=None):
+    """
+    Saves features and labels of documents (lists of (word, ctag, label)) to directory.
+    Features are taken from FeatureCache cache when given, and stored in it on a miss.
+    """
+    if cache is not None:
+        store, hit = cache.load_store(data, extract, workers=workers)
+    else:
+        store = FeatureStore.from_documents(data, extract, workers=workers)
+    store.save_arrays(directory)
+    vocab = Vocabulary()
+    label_ids = np.array([vocab.get_id(label) for doc in data for (word, tag, label) in doc], dtype=np.int32)
+    np.save(os.path.join(directory, 'label_ids.npy'), label_ids)
+    with open(os.path.join(directory, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump(vocab.items, f, ensure_ascii=False)
+
+
+def _open_search_data(directory):
+    #pool initializer, arrays are mapped once per worker and shared through page cache
+    global _store, _labels
+    _store = FeatureStore.load_arrays(directory)
+    with open(os.path.join(directory, 'labels.json'), encoding='utf-8') as f:
+        items = json.load(f)
+    _labels = (items, np.load(os.path.join(directory, 'label_ids.npy'), mmap_mode='r'))
+
+
+def _sequence_labels(index):
+    items, label_ids = _labels
+    begin, end = _store.seq_offsets[index], _store.seq_offsets[index + 1]
+    return [items[id] for id in label_ids[begin:end].tolist()]
+
+
+def _fit_and_score(task):
+    candidate, fold, parameters, crf_params, train_indices, test_indices, labels = task
+    crf = sklearn_crfsuite.CRF(**dict(crf_params, **parameters))
+    crf.fit((_store.sequence(i) for i in train_indices), (_sequence_labels(i) for i in train_indices))
+    y_pred = [crf.predict_single(_store.sequence(i)) for i in test_indices]
+    y_test = [_sequence_labels(i) for i in test_indices]
+    score = metrics.flat_f1_score(y_test, y_pred, average='weighted', labels=labels)
+    #ru_maxrss is in kilobytes on Linux
+    return candidate, fold, score, os.getpid(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def sample_candidates(n_iter=20, random_state=None):
+    """
+    Returns n_iter parameter dicts sampled as in the notebooks.
+    """
+    random_state = np.random.RandomState(random_state)
+    c1 = scipy.stats.expon(scale=0.5).rvs(size=n_iter, random_state=random_state)
+    c2 = scipy.stats.expon(scale=0.05).rvs(size=n_iter, random_state=random_state)
+    return [{'c1': a, 'c2': b} for a, b in zip(c1.tolist(), c2.tolist())]
+
+
+class CRFSearch():
+
+    def __init__(self, directory, crf_params=None, cv=3, labels=None, outside='I', workers=None):
+        """
+        Search on data saved by write_search_data in directory.
+        Score is weighted F1 over labels, all labels except outside by default.
+        """
+        self.directory = directory
+        self.crf_params = crf_params or {'algorithm': 'lbfgs', 'max_iterations': 100,
+                                         'all_possible_transitions': True}
+        self.cv = cv
+        self.workers = workers
+        if labels is None:
+            with open(os.path.join(directory, 'labels.json'), encoding='utf-8') as f:
+                labels = [label for label in json.load(f) if label != outside]
+        self.labels = labels
+        self.worker_rss_ = {}
+
+    def _run(self, tasks):
+        #returns {(candidate, fold): score}, records peak RSS of workers
+        scores = {}
+        if self.workers == 1:
+            _open_search_data(self.directory)
+            results = map(_fit_and_score, tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.workers, initializer=_open_search_data, initargs=(self.directory,))
+            results = pool.imap_unordered(_fit_and_score, tasks)
+        try:
+            for candidate, fold, score, pid, rss in results:
+                scores[candidate, fold] = score
+                self.worker_rss_[pid] = max(rss, self.worker_rss_.get(pid, 0))
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return scores
+
+    def folds(self):
+        sequences = len(np.load(os.path.join(self.directory, 'seq_offsets.npy'), mmap_mode='r')) - 1
+        return [(train.tolist(), test.tolist()) for train, test in KFold(n_splits=self.cv).split(np.arange(sequences))]
+
+    def fit(self, candidates):
+        """
+        Scores every candidate (dict of CRF parameters) on cv folds.
+        """
+        folds = self.folds()
+        tasks = [(candidate, fold, parameters, self.crf_params, train, test, self.labels)
+                 for candidate, parameters in enumerate(candidates)
+                 for fold, (train, test) in enumerate(folds)]
+        scores = self._run(tasks)
+        self.grid_scores_ = []
+        for candidate, parameters in enumerate(candidates):
+            cv_scores = np.array([scores[candidate, fold] for fold in range(len(folds))])
+            self.grid_scores_.append(CVScore(parameters, float(cv_scores.mean()), cv_scores))
+        best = max(self.grid_scores_, key=lambda score: score.mean_validation_score)
+        self.best_params_ = best.parameters
+        self.best_score_ = best.mean_validation_score
+        return self
+
+    def fit_halving(self, candidates, factor=3, min_iterations=10, min_fraction=0.1, random_state=0):
+        """
+        Successive halving: in every rung candidates are scored on cv folds with
+        training data and max_iterations scaled down by factor for every rung left,
+        then the best 1/factor of them go to the next rung. The last rung trains
+        on all data with max_iterations of crf_params.
+        grid_scores_ holds score of every candidate from the last rung it reached,
+        halving_results_ all scores as (rung, max_iterations, fraction of data, CVScore).
+        """
+        max_iterations = self.crf_params.get('max_iterations', 100)
+        rungs = 1
+        while factor ** rungs <= len(candidates):
+            rungs += 1
+        #training documents are taken from shuffled folds, so subsets are not biased to corpus order
+        rng = np.random.RandomState(random_state)
+        folds = [(rng.permutation(train).tolist(), test) for train, test in self.folds()]
+        alive = list(range(len(candidates)))
+        latest = {}
+        self.halving_results_ = []
+        for rung in range(rungs):
+            scale = float(factor) ** (rung - rungs + 1)
+            iterations = max(min_iterations, int(round(max_iterations * scale)))
+            fraction = min(1.0, max(min_fraction, scale))
+            crf_params = dict(self.crf_params, max_iterations=iterations)
+            tasks = [(candidate, fold, candidates[candidate], crf_params,
+                      train[:max(1, int(len(train) * fraction))], test, self.labels)
+                     for candidate in alive
+                     for fold, (train, test) in enumerate(folds)]
+            scores = self._run(tasks)
+            for candidate in alive:
+                cv_scores = np.array([scores[candidate, fold] for fold in range(len(folds))])
+                latest[candidate] = CVScore(candidates[candidate], float(cv_scores.mean()), cv_scores)
+                self.halving_results_.append((rung, iterations, fraction, latest[candidate]))
+            alive.sort(key=lambda candidate: -latest[candidate].mean_validation_score)
+            if rung < rungs - 1:
+                alive = alive[:max(1, len(alive) // factor)]
+        self.grid_scores_ = [latest[candidate] for candidate in range(len(candidates))]
+        self.best_params_ = latest[alive[0]].parameters
+        self.best_score_ = latest[alive[0]].mean_validation_score
+        return self
+
+    def rss_stats(self):
+        return "\n".join("Worker %d: peak RSS %.1f MB" % (pid, rss / 1024)
+                         for pid, rss in sorted(self.worker_rss_.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search c1/c2 of CRF on pickled word_data_file.obj.')
+    parser.add_argument('data', nargs='?', default='word_data_file.obj', help='pickled list of documents')
+    parser.add_argument('--directory', default='search_data', help='directory for memory mapped features')
+    parser.add_argument('--n-iter', type=int, default=20, help='number of sampled candidates')
+    parser.add_argument('--cv', type=int, default=3, help='number of folds')
+    parser.add_argument('--max-iterations', type=int, default=100, help='max_iterations of CRF training')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--template', choices=sorted(TEMPLATES), default='dict',
+                        help='feature template: dict of the NKJP notebooks or list of crf_test.py')
+    parser.add_argument('--cache', default='feature_cache',
+                        help="feature cache directory, shared with crf_test.py ('' to extract without cache)")
+    parser.add_argument('--seed', type=int, default=None, help='random state of candidate sampling')
+    parser.add_argument('--halving', action='store_true', help='use successive halving')
+    parser.add_argument('--factor', type=int, default=3, help='successive halving: keep 1/factor of candidates')
+    args = parser.parse_args()
+
+    with open(args.data, 'rb') as infile:
+        data = pickle.load(infile)
+    cache = FeatureCache(args.cache) if args.cache else None
+    write_search_data(args.directory, data, TEMPLATES[args.template], workers=args.workers, cache=cache)
+    del data
+    if cache is not None:
+        print(cache.stats())
+    rs = CRFSearch(args.directory, {'algorithm': 'lbfgs', 'max_iterations': args.max_iterations,
+                                    'all_possible_transitions': True}, cv=args.cv, workers=args.workers)
+    candidates = sample_candidates(args.n_iter, args.seed)
+    if args.halving:
+        rs.fit_halving(candidates, factor=args.factor)
+        for rung, iterations, fraction, score in rs.halving_results_:
+            print("rung %d (max_iterations=%d, data %.2f) c1=%.4f c2=%.4f: %.4f"
+                  % (rung, iterations, fraction, score.parameters['c1'], score.parameters['c2'],
+                     score.mean_validation_score))
+    else:
+        rs.fit(candidates)
+    for score in sorted(rs.grid_scores_, key=lambda score: -score.mean_validation_score):
+        print("c1=%.4f c2=%.4f: %.4f" % (score.parameters['c1'], score.parameters['c2'], score.mean_validation_score))
+    print('best params:', rs.best_params_)
+    print('best CV score:', rs.best_score_)
+    print(rs.rss_stats())
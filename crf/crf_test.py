@@ -1,155 +1,101 @@
-import codecs
-import numpy as np
 import nltk
-import pycrfsuite
-from bs4 import BeautifulSoup as bs
-from bs4.element import Tag
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
 
-nltk.download('averaged_perceptron_tagger')
+from features import extract_features
+from feature_cache import FeatureCache
+from batch_tagging import BatchTagger
+from reuters_corpus import iter_documents
+from pos_tagging import PosTagCache, pos_tag_documents
+from crf_training import EarlyStoppingTrainer
+from evaluation import StreamingEvaluator
 
-# Read data file and parse the XML
-with codecs.open("reuters.xml", "r", "utf-8") as infile:
-    soup = bs(infile, "html5lib")
-
-docs = []
-for elem in soup.find_all("document"):
-    texts = []
-
-    # Loop through each child of the element under "textwithnamedentities"
-    for c in elem.find("textwithnamedentities").children:
-        if type(c) == Tag:
-            if c.name == "namedentityintext":
-                label = "N"  # part of a named entity
-            else:
-                label = "I"  # irrelevant word
-            for w in c.text.split(" "):
-                if len(w) > 0:
-                    texts.append((w, label))
-    docs.append(texts)
-
-
-data = []
-for i, doc in enumerate(docs):
-
-    # Obtain the list of tokens in the document
-    tokens = [t for t, label in doc]
-
-    # Perform POS tagging
-    tagged = nltk.pos_tag(tokens)
-
-    # Take the word, POS tag, and its label
-    data.append([(w, pos, label) for (w, label), (word, pos) in zip(doc, tagged)])
-
-
-def word2features(doc, i):
-    word = doc[i][0]
-    postag = doc[i][1]
-
-    # Common features for all words
-    features = [
-        'bias',
-        'word.lower=' + word.lower(),
-        'word[-3:]=' + word[-3:],
-        'word[-2:]=' + word[-2:],
-        'word.isupper=%s' % word.isupper(),
-        'word.istitle=%s' % word.istitle(),
-        'word.isdigit=%s' % word.isdigit(),
-        'postag=' + postag
-    ]
-
-    # Features for words that are not
-    # at the beginning of a document
-    if i > 0:
-        word1 = doc[i-1][0]
-        postag1 = doc[i-1][1]
-        features.extend([
-            '-1:word.lower=' + word1.lower(),
-            '-1:word.istitle=%s' % word1.istitle(),
-            '-1:word.isupper=%s' % word1.isupper(),
-            '-1:word.isdigit=%s' % word1.isdigit(),
-            '-1:postag=' + postag1
-        ])
-    else:
-        # Indicate that it is the 'beginning of a document'
-        features.append('BOS')
-
-    # Features for words that are not 
-    # at the end of a document
-    if i < len(doc)-1:
-        word1 = doc[i+1][0]
-        postag1 = doc[i+1][1]
-        features.extend([
-            '+1:word.lower=' + word1.lower(),
-            '+1:word.istitle=%s' % word1.istitle(),
-            '+1:word.isupper=%s' % word1.isupper(),
-            '+1:word.isdigit=%s' % word1.isdigit(),
-            '+1:postag=' + postag1
-        ])
-    else:
-        # Indicate that it is the 'end of a document'
-        features.append('EOS')
-
-    return features
-
-# A function for extracting features in documents
-def extract_features(doc):
-    return [word2features(doc, i) for i in range(len(doc))]
 
 # A function fo generating the list of labels for each document
 def get_labels(doc):
     return [label for (token, postag, label) in doc]
 
 
-X = [extract_features(doc) for doc in data]
-y = [get_labels(doc) for doc in data]
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
-
-trainer = pycrfsuite.Trainer(verbose=True)
+# Guard is needed by multiprocessing pools used below
+if __name__ == "__main__":
+    nltk.download('averaged_perceptron_tagger')
 
-# Submit training data to the trainer
-for xseq, yseq in zip(X_train, y_train):
-    trainer.append(xseq, yseq)
+    # Read data file, Document elements are parsed one by one
+    # into lists of (word, label), "N" for named entity words and "I" for others
+    docs = list(iter_documents("reuters.xml"))
 
-# Set the parameters of the model
-trainer.set_params({
-    # coefficient for L1 penalty
-    'c1': 0.1,
 
-    # coefficient for L2 penalty
-    'c2': 0.01,  
+    # Perform POS tagging in batches, tags of documents tagged
+    # in previous runs are loaded from cache
+    pos_cache = PosTagCache('pos_tags.pickle')
+    tagged = pos_tag_documents([[t for t, label in doc] for doc in docs], pos_cache)
+    print(pos_cache.stats())
 
-    # maximum number of iterations
-    'max_iterations': 200,
-
-    # whether to include transitions that
-    # are possible, but not observed
-    'feature.possible_transitions': True
-})
-
-# Provide a file name as a parameter to the train function, such that
-# the model will be saved to the file when training is finished
-trainer.train('crf.model')
-
-# Generate predictions
-tagger = pycrfsuite.Tagger()
-tagger.open('crf.model')
-y_pred = [tagger.tag(xseq) for xseq in X_test]
-
-# Let's take a look at a random sample in the testing set
-i = 12
-for x, y in zip(y_pred[i], [x[1].split("=")[1] for x in X_test[i]]):
-    print("%s (%s)" % (y, x))
-
-# Create a mapping of labels to indices
-labels = {"N": 1, "I": 0}
-
-# Convert the sequences of tags into a 1-dimensional array
-predictions = np.array([labels[tag] for row in y_pred for tag in row])
-truths = np.array([labels[tag] for row in y_test for tag in row])
-
-# Print out the classification report
-print(classification_report(
-    truths, predictions,
-    target_names=["I", "N"]))
+    # Take the word, POS tag, and its label
+    data = [[(w, pos, label) for (w, label), pos in zip(doc, tags)]
+            for doc, tags in zip(docs, tagged)]
+
+
+    # Keep features as integer ids, feature strings are stored only once.
+    # Documents are encoded in chunks on all cores, or loaded from cache
+    # if neither the tagged documents nor features.py changed since the last run.
+    feature_cache = FeatureCache('feature_cache')
+    X, hit = feature_cache.load_store(data, extract_features)
+    print(feature_cache.stats())
+    y = [get_labels(doc) for doc in data]
+    train_indices, test_indices = train_test_split(range(len(X)), test_size=0.2)
+    # Part of the training documents is held out to decide when to stop training
+    train_indices, holdout_indices = train_test_split(train_indices, test_size=0.1)
+    y_train = [y[i] for i in train_indices]
+    y_holdout = [y[i] for i in holdout_indices]
+    y_test = [y[i] for i in test_indices]
+
+    # Held-out F1 is checked every 10 iterations, training stops
+    # after 3 checks without improvement
+    trainer = EarlyStoppingTrainer(interval=10, patience=3, verbose=True)
+
+    # Submit training data to the trainer, held-out data as group 1
+    for xseq, yseq in zip(X.item_sequences(train_indices), y_train):
+        trainer.append(xseq, yseq)
+    for xseq, yseq in zip(X.item_sequences(holdout_indices), y_holdout):
+        trainer.append(xseq, yseq, 1)
+
+    # Set the parameters of the model
+    trainer.set_params({
+        # coefficient for L1 penalty
+        'c1': 0.1,
+
+        # coefficient for L2 penalty
+        'c2': 0.01,  
+
+        # maximum number of iterations
+        'max_iterations': 200,
+
+        # whether to include transitions that
+        # are possible, but not observed
+        'feature.possible_transitions': True
+    })
+
+    # Provide a file name as a parameter to the train function, such that
+    # the model of the best iteration will be saved to the file
+    trainer.train('crf.model', holdout=1)
+    print(trainer.stats())
+
+    # Generate predictions in chunks, model is opened once in every worker process.
+    # Chunks are evaluated as they come, only counts of labels are kept
+    evaluator = StreamingEvaluator(outside="I")
+    with BatchTagger('crf.model') as tagger:
+        for begin in range(0, len(test_indices), 1000):
+            y_pred = tagger.tag(X.sequence(i) for i in test_indices[begin:begin + 1000])
+            evaluator.update(y_test[begin:begin + 1000], y_pred)
+            if begin == 0:
+                sample = y_pred
+        print(tagger.stats())
+
+    # Let's take a look at a random sample in the testing set
+    i = 12
+    for x, y in zip(sample[i], [x[1].split("=")[1] for x in X.sequence(test_indices[i])]):
+        print("%s (%s)" % (y, x))
+
+    # Print out the classification report
+    print(evaluator.classification_report(labels=["I", "N"]))
+    print(evaluator.entity_report())
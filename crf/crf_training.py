@@ -0,0 +1,105 @@
+"""
+pycrfsuite training with early stopping on held-out F1.
+Sequences appended with group 1 (trainer.append(xseq, yseq, 1)) are not used
+for training, CRFsuite tags them after every iteration. Every interval
+iterations their weighted F1 (labels other than outside) is checked and
+training stops after patience checks without improvement.
+CRFsuite writes the model only when training ends, so the best checkpoint is
+written by training again up to the best iteration, which gives the same
+weights as L-BFGS is deterministic.
+use example:
+trainer = EarlyStoppingTrainer(interval=10, patience=3, verbose=False)
+trainer.append(xseq, yseq)      # training
+trainer.append(xseq, yseq, 1)   # held-out
+trainer.set_params({'c1': 0.1, 'c2': 0.01, 'max_iterations': 200})
+trainer.train('crf.model', holdout=1)
+print(trainer.stats())
+"""
+import time
+
+import pycrfsuite
+
+
+class _EarlyStop(Exception):
+    pass
+
+
+class EarlyStoppingTrainer(pycrfsuite.Trainer):
+
+    def __init__(self, interval=10, patience=3, outside='I', **kwargs):
+        super().__init__(**kwargs)
+        self.interval = interval
+        self.patience = patience
+        self.outside = outside
+
+    def message(self, message):
+        #callbacks of pycrfsuite.Trainer are called only in verbose mode, iterations are always needed here
+        event = self.logparser.feed(message)
+        if event == 'iteration':
+            self.on_iteration(self.logparser.last_log, self.logparser.last_iteration)
+        elif event is not None and self.verbose:
+            print(self.logparser.last_log, end='')
+
+    def holdout_f1(self, info):
+        """
+        Returns weighted F1 of held-out labels other than outside from iteration info.
+        """
+        scores = [score for label, score in info['scores'].items()
+                  if label != self.outside and score.ref > 0]
+        refs = sum(score.ref for score in scores)
+        if not refs:
+            return 0.0
+        return sum((score.f1 or 0.0) * score.ref for score in scores) / refs
+
+    def on_iteration(self, log, info):
+        if self.verbose:
+            print(log, end='')
+        if not self.evaluating or info['num'] % self.interval:
+            return
+        f1 = self.holdout_f1(info)
+        self.history.append((info['num'], f1))
+        if f1 > self.best_f1:
+            self.best_f1 = f1
+            self.best_iteration = info['num']
+            self.bad_checks = 0
+        else:
+            self.bad_checks += 1
+            if self.bad_checks >= self.patience:
+                raise _EarlyStop()
+
+    def train(self, model, holdout=-1):
+        """
+        Trains model, with early stopping if holdout group is given.
+        """
+        self.history = []
+        self.best_f1 = -1.0
+        self.best_iteration = None
+        self.bad_checks = 0
+        self.stopped = False
+        self.evaluating = holdout >= 0
+        start = time.perf_counter()
+        try:
+            super().train(model, holdout)
+        except _EarlyStop:
+            self.stopped = True
+        self.iterations = len(self.logparser.iterations)
+        if self.evaluating and self.best_iteration is not None and self.best_iteration != self.iterations:
+            #write checkpoint of the best iteration, its log was already printed
+            self.evaluating = False
+            max_iterations = self.get('max_iterations')
+            verbose = self.verbose
+            self.set('max_iterations', self.best_iteration)
+            self.verbose = False
+            try:
+                super().train(model, holdout)
+            finally:
+                self.set('max_iterations', max_iterations)
+                self.verbose = verbose
+        self.training_seconds = time.perf_counter() - start
+
+    def stats(self):
+        if self.best_iteration is None:
+            return "Iterations: %d, %.1fs" % (self.iterations, self.training_seconds)
+        return "Iterations: %d%s, best held-out F1 %.4f at iteration %d, %.1fs" % (
+            self.iterations, " (stopped early)" if self.stopped else "",
+            self.best_f1, self.best_iteration, self.training_seconds)
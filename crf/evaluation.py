@@ -0,0 +1,171 @@
+"""
+Evaluation of tagged sequences chunk by chunk.
+StreamingEvaluator keeps only label confusion counts and entity counts,
+so predictions of any size can be evaluated as they come from BatchTagger.
+classification_report gives the same text as sklearn classification_report
+(and sklearn_crfsuite flat_classification_report) on flattened labels.
+Entities are runs of the same label other than outside (IO scheme)
+or spans built from B-/I-/L-/U- prefixes (BIO, BILOU).
+use example:
+evaluator = StreamingEvaluator(outside='I')
+for chunk in chunks:
+    evaluator.update([y[i] for i in chunk], tagger.tag(X.sequence(i) for i in chunk))
+print(evaluator.classification_report(labels=['I', 'N']))
+print(evaluator.entity_report())
+"""
+from collections import Counter
+
+import numpy as np
+
+
+def entity_spans(labels, outside='I'):
+    """
+    Returns set of (type, begin, end) entities of label sequence.
+    """
+    spans = set()
+    entity_type = begin = None
+    for i, label in enumerate(list(labels) + [outside]):
+        prefix, _, name = label.partition('-') if label[1:2] == '-' else ('', '', label)
+        continues = (entity_type is not None and name == entity_type
+                     and prefix in ('', 'I', 'L') and label != outside)
+        if not continues:
+            if entity_type is not None:
+                spans.add((entity_type, begin, i))
+            entity_type, begin = (name, i) if label != outside else (None, None)
+        if prefix in ('L', 'U') and entity_type is not None:
+            spans.add((entity_type, begin, i + 1))
+            entity_type = begin = None
+    return spans
+
+
+def _divide(numerator, denominator):
+    #zero when undefined, as sklearn with zero_division='warn'
+    return numerator / denominator if denominator else 0.0
+
+
+def _format_report(rows, averages, digits):
+    #same layout as sklearn.metrics.classification_report
+    headers = ["precision", "recall", "f1-score", "support"]
+    longest_last_line_heading = "weighted avg"
+    name_width = max([len(name) for name, _, _, _, _ in rows] + [0])
+    width = max(name_width, len(longest_last_line_heading), digits)
+    head_fmt = "{:>{width}s} " + " {:>9}" * len(headers)
+    report = head_fmt.format("", *headers, width=width)
+    report += "\n\n"
+    row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+    for row in rows:
+        report += row_fmt.format(*row, width=width, digits=digits)
+    report += "\n"
+    for line_heading, avg in averages:
+        if line_heading == "accuracy":
+            row_fmt_accuracy = "{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n"
+            report += row_fmt_accuracy.format(line_heading, "", "", *avg[2:], width=width, digits=digits)
+        else:
+            report += row_fmt.format(line_heading, *avg, width=width, digits=digits)
+    return report
+
+
+def _report(counts, labels, target_names, digits, micro_is_accuracy):
+    #counts: label -> (true positives, predicted, true)
+    rows = []
+    for name, label in zip(target_names, labels):
+        tp, predicted, true = counts.get(label, (0, 0, 0))
+        rows.append((name, _divide(tp, predicted), _divide(tp, true), _divide(2 * tp, predicted + true), true))
+    support = sum(row[4] for row in rows)
+    tp, predicted, true = [sum(counts.get(label, (0, 0, 0))[i] for label in labels) for i in range(3)]
+    averages = [
+        ("accuracy" if micro_is_accuracy else "micro avg",
+         (_divide(tp, predicted), _divide(tp, true), _divide(2 * tp, predicted + true), support)),
+        ("macro avg", tuple(float(np.mean([row[i] for row in rows])) if rows else 0.0 for i in (1, 2, 3))
+         + (support,)),
+        ("weighted avg", tuple(_divide(sum(row[i] * row[4] for row in rows), support) for i in (1, 2, 3))
+         + (support,)),
+    ]
+    return _format_report(rows, averages, digits)
+
+
+class StreamingEvaluator():
+
+    def __init__(self, outside='I'):
+        self.outside = outside
+        self.confusion = Counter()
+        self.entities = Counter()
+        self.sequences = 0
+        self.tokens = 0
+
+    def update(self, y_true, y_pred):
+        """
+        Adds chunk of sequences: lists of true and predicted labels.
+        """
+        for true_seq, pred_seq in zip(y_true, y_pred):
+            if len(true_seq) != len(pred_seq):
+                raise ValueError('Sequences of true and predicted labels differ in length')
+            self.confusion.update(zip(true_seq, pred_seq))
+            true_spans = entity_spans(true_seq, self.outside)
+            pred_spans = entity_spans(pred_seq, self.outside)
+            self.entities.update(('tp', span[0]) for span in true_spans & pred_spans)
+            self.entities.update(('predicted', span[0]) for span in pred_spans)
+            self.entities.update(('true', span[0]) for span in true_spans)
+            self.sequences += 1
+            self.tokens += len(true_seq)
+
+    def labels(self):
+        return sorted(set(label for pair in self.confusion for label in pair))
+
+    def confusion_matrix(self, labels=None):
+        """
+        Returns matrix of counts, rows are true labels, columns predicted labels.
+        """
+        labels = self.labels() if labels is None else labels
+        return np.array([[self.confusion[true, pred] for pred in labels] for true in labels], dtype=np.int64)
+
+    def label_counts(self):
+        #label -> (true positives, predicted, true)
+        counts = {}
+        for (true, pred), n in self.confusion.items():
+            for label, i in ((true, 2), (pred, 1)):
+                counts.setdefault(label, [0, 0, 0])[i] += n
+            if true == pred:
+                counts[true][0] += n
+        return counts
+
+    def classification_report(self, labels=None, target_names=None, digits=2):
+        """
+        Token level report, as sklearn classification_report of flattened sequences.
+        """
+        all_labels = self.labels()
+        micro_is_accuracy = labels is None or set(labels) >= set(all_labels)
+        labels = all_labels if labels is None else list(labels)
+        target_names = ["%s" % label for label in labels] if target_names is None else target_names
+        return _report(self.label_counts(), labels, target_names, digits, micro_is_accuracy)
+
+    def flat_f1_score(self, labels=None, average='weighted'):
+        """
+        Token level F1, as sklearn_crfsuite.metrics.flat_f1_score.
+        """
+        counts = self.label_counts()
+        labels = self.labels() if labels is None else labels
+        scores = []
+        for label in labels:
+            tp, predicted, true = counts.get(label, (0, 0, 0))
+            scores.append((_divide(2 * tp, predicted + true), true))
+        if average == 'weighted':
+            return _divide(sum(f1 * true for f1, true in scores), sum(true for f1, true in scores))
+        if average == 'macro':
+            return float(np.mean([f1 for f1, true in scores])) if scores else 0.0
+        if average == 'micro':
+            tp, predicted, true = [sum(counts.get(label, (0, 0, 0))[i] for label in labels) for i in range(3)]
+            return _divide(2 * tp, predicted + true)
+        raise NameError('No such average!')
+
+    def entity_report(self, digits=2):
+        """
+        Entity level report: entity counts as found only if type, begin and end match.
+        """
+        types = sorted(set(name for kind, name in self.entities))
+        counts = {name: (self.entities['tp', name], self.entities['predicted', name], self.entities['true', name])
+                  for name in types}
+        return _report(counts, types, types, digits, False)
+
+    def stats(self):
+        return "Sequences: %d, tokens: %d" % (self.sequences, self.tokens)
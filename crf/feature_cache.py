@@ -0,0 +1,82 @@
+"""
+On-disk cache of extracted CRF features.
+Entries are keyed by sha1 of the documents themselves (every token with its
+POS tag and label) and fingerprint of the feature template
+(features.template_fingerprint), so features are computed again whenever
+the template, the corpus, its parsing or the POS tagger output changes.
+FeatureStore of string features is saved as .npz, other features
+(dicts of extract_features_dict for sklearn_crfsuite) are pickled.
+use example:
+cache = FeatureCache('feature_cache')
+X, hit = cache.load_store(data)  # pycrfsuite, crf_test.py
+X, hit = cache.load_features(data, extract_features_dict)  # notebooks
+"""
+import hashlib
+import os
+import pickle
+
+from cache_files import TMP_SUFFIX, CacheCounter, atomic_write
+from feature_store import FeatureStore
+from features import extract_features, extract_features_parallel, template_fingerprint
+
+
+class FeatureCache(CacheCounter):
+
+    def __init__(self, directory):
+        CacheCounter.__init__(self, 'Feature cache')
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def get_key(self, data, extract):
+        key = hashlib.sha1(template_fingerprint(extract).encode())
+        for doc in data:
+            #fields are separated by \0, tokens by \1 and documents by \2
+            key.update('\1'.join('\0'.join(map(str, token)) for token in doc).encode('utf-8'))
+            key.update(b'\2')
+        return key.hexdigest()
+
+    def get_file(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def load_store(self, data, extract=extract_features, workers=None):
+        """
+        Returns (FeatureStore of extract(doc) for every document of data, True if it was found in cache).
+        data are documents (lists of (word, postag, ...)), features are extracted and stored on a miss.
+        """
+        cache_file = self.get_file(self.get_key(data, extract), '.npz')
+        if os.path.exists(cache_file):
+            self.record(True)
+            return FeatureStore.load(cache_file), True
+        store = FeatureStore.from_documents(data, extract, workers=workers)
+        atomic_write(cache_file, store.save)
+        self.record(False)
+        return store, False
+
+    def load_features(self, data, extract=extract_features, workers=None):
+        """
+        Returns ([extract(doc) for doc in data], True if it was found in cache).
+        """
+        cache_file = self.get_file(self.get_key(data, extract), '.pickle')
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                features = pickle.load(f)
+            self.record(True)
+            return features, True
+        features = extract_features_parallel(data, extract, workers=workers)
+        atomic_write(cache_file, lambda f: pickle.dump(features, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.record(False)
+        return features, False
+
+    def clean(self):
+        """
+        Removes all entries, except temporary files of entries being written.
+        Returns number of removed files.
+        """
+        removed = 0
+        for filename in os.listdir(self.directory):
+            if filename.endswith(TMP_SUFFIX):
+                continue
+            os.remove(os.path.join(self.directory, filename))
+            removed += 1
+        return removed
@@ -0,0 +1,174 @@
+"""
+Compact store of pycrfsuite feature sequences.
+Every distinct feature string (e.g. 'word.lower=kot') is kept once in a
+Vocabulary and sequences are stored as integer ids with token and
+sequence offsets, instead of lists of Python strings per token.
+Dict features (extract_features_dict) are stored as strings the same way
+pycrfsuite reads them: 'key=value' for strings, 'key' for True and 1.0.
+use example:
+store = FeatureStore()
+for doc in data:
+    store.append(extract_features(doc))
+trainer.append(store.item_sequence(i), y[i])
+"""
+import json
+import multiprocessing
+import os
+from array import array
+
+import numpy as np
+import pycrfsuite
+
+from corpus_columns import Vocabulary
+from features import extract_features
+
+
+def _items(features):
+    #dict of token features -> list of feature strings, as pycrfsuite.ItemSequence does
+    if not isinstance(features, dict):
+        return features
+    items = []
+    for key, value in features.items():
+        if isinstance(value, str):
+            items.append('%s=%s' % (key, value))
+        elif value == 1:
+            items.append(key)
+        elif value != 0:
+            raise ValueError('Feature %s has weight %r, only 0 and 1 can be stored' % (key, value))
+    return items
+
+
+def _encode_chunk(args):
+    #features of chunk of documents as (vocabulary, ids, token offsets, sequence offsets)
+    docs, extract = args
+    store = FeatureStore()
+    for doc in docs:
+        store.append(extract(doc))
+    return store.vocab.items, store.ids, store.token_offsets, store.seq_offsets
+
+
+class FeatureStore():
+
+    def __init__(self, vocab=None):
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.ids = array('i')
+        self.token_offsets = array('q', [0])
+        self.seq_offsets = array('q', [0])
+
+    def append(self, xseq):
+        """
+        Adds one sequence: list of feature string lists (or feature dicts), one per token.
+        """
+        get_id = self.vocab.get_id
+        for features in xseq:
+            self.ids.extend([get_id(feature) for feature in _items(features)])
+            self.token_offsets.append(len(self.ids))
+        self.seq_offsets.append(len(self.token_offsets) - 1)
+
+    def extend(self, xseqs):
+        for xseq in xseqs:
+            self.append(xseq)
+
+    def extend_encoded(self, items, ids, token_offsets, seq_offsets):
+        """
+        Adds sequences encoded with another vocabulary (items), translating their ids.
+        """
+        remap = np.array([self.vocab.get_id(item) for item in items], dtype=np.int32)
+        ids = np.frombuffer(ids, dtype=np.int32)
+        token_base = len(self.ids)
+        seq_base = len(self.token_offsets) - 1
+        self.ids.frombytes(remap[ids].tobytes() if len(ids) else b'')
+        self.token_offsets.extend([offset + token_base for offset in token_offsets[1:]])
+        self.seq_offsets.extend([offset + seq_base for offset in seq_offsets[1:]])
+
+    @classmethod
+    def from_documents(cls, data, extract=extract_features, workers=None, chunksize=None):
+        """
+        Returns store with extract(doc) of every document, in order.
+        Documents are split into chunks encoded in a pool of workers processes
+        (all cores by default), each chunk comes back as integer ids only.
+        """
+        self = cls()
+        if workers == 1:
+            for doc in data:
+                self.append(extract(doc))
+            return self
+        if chunksize is None:
+            chunksize = max(1, len(data) // ((workers or os.cpu_count()) * 4))
+        with multiprocessing.Pool(workers) as pool:
+            chunks = [(data[i:i + chunksize], extract) for i in range(0, len(data), chunksize)]
+            for encoded in pool.imap(_encode_chunk, chunks):
+                self.extend_encoded(*encoded)
+        return self
+
+    def __len__(self):
+        return len(self.seq_offsets) - 1
+
+    def sequence_ids(self, index):
+        """
+        Returns list of feature id arrays, one per token of sequence.
+        """
+        begin, end = self.seq_offsets[index], self.seq_offsets[index + 1]
+        offsets = self.token_offsets[begin:end + 1]
+        return [self.ids[offsets[i]:offsets[i + 1]] for i in range(end - begin)]
+
+    def sequence(self, index):
+        """
+        Returns sequence as list of feature string lists, the same as it was appended.
+        """
+        items = self.vocab.items
+        return [[items[id] for id in ids.tolist()] for ids in self.sequence_ids(index)]
+
+    def item_sequence(self, index):
+        """
+        Returns sequence as pycrfsuite.ItemSequence, ready for Trainer.append and Tagger.tag.
+        """
+        return pycrfsuite.ItemSequence(self.sequence(index))
+
+    def item_sequences(self, indices=None):
+        for index in (range(len(self)) if indices is None else indices):
+            yield self.item_sequence(index)
+
+    def save(self, filename):
+        """
+        Saves store to .npz file (vocabulary included).
+        """
+        np.savez(filename,
+                 ids=np.frombuffer(self.ids, dtype=np.int32),
+                 token_offsets=np.frombuffer(self.token_offsets, dtype=np.int64),
+                 seq_offsets=np.frombuffer(self.seq_offsets, dtype=np.int64),
+                 vocab=np.array(self.vocab.items, dtype=object))
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=True) as arrays:
+            self = cls(Vocabulary(arrays['vocab'].tolist()))
+            self.ids = array('i', arrays['ids'].tobytes())
+            self.token_offsets = array('q', arrays['token_offsets'].tobytes())
+            self.seq_offsets = array('q', arrays['seq_offsets'].tobytes())
+        return self
+
+    def save_arrays(self, directory):
+        """
+        Saves store to directory of .npy arrays and vocab.json, which load_arrays
+        can memory map, so processes opening it share one copy of the ids.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.vocab.items, f, ensure_ascii=False)
+        np.save(os.path.join(directory, 'ids.npy'), np.frombuffer(self.ids, dtype=np.int32))
+        np.save(os.path.join(directory, 'token_offsets.npy'), np.frombuffer(self.token_offsets, dtype=np.int64))
+        np.save(os.path.join(directory, 'seq_offsets.npy'), np.frombuffer(self.seq_offsets, dtype=np.int64))
+
+    @classmethod
+    def load_arrays(cls, directory, mmap=True):
+        """
+        Opens store saved with save_arrays. Memory mapped store is read only.
+        """
+        with open(os.path.join(directory, 'vocab.json'), encoding='utf-8') as f:
+            self = cls(Vocabulary(json.load(f)))
+        mmap_mode = 'r' if mmap else None
+        for name in ('ids', 'token_offsets', 'seq_offsets'):
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode))
+        return self
@@ -0,0 +1,216 @@
+"""
+Token feature templates of the CRF pipeline.
+word2features builds list of strings for pycrfsuite (crf_test.py),
+word2features_dict builds dict for sklearn_crfsuite (NKJP notebooks).
+extract_features and extract_features_dict give the same features for
+a whole document, computing attributes of every token only once and
+reusing them for the -1: and +1: features of its neighbours.
+extract_features_parallel runs any of them over documents in a pool of processes.
+template_fingerprint identifies the templates for feature caches (feature_cache.py),
+bump FEATURES_VERSION when templates start to depend on code outside of this file.
+"""
+import hashlib
+import inspect
+import multiprocessing
+import os
+import sys
+
+FEATURES_VERSION = 1
+
+
+def word2features(doc, i):
+    word = doc[i][0]
+    postag = doc[i][1]
+
+    # Common features for all words
+    features = [
+        'bias',
+        'word.lower=' + word.lower(),
+        'word[-3:]=' + word[-3:],
+        'word[-2:]=' + word[-2:],
+        'word.isupper=%s' % word.isupper(),
+        'word.istitle=%s' % word.istitle(),
+        'word.isdigit=%s' % word.isdigit(),
+        'postag=' + postag
+    ]
+
+    # Features for words that are not
+    # at the beginning of a document
+    if i > 0:
+        word1 = doc[i-1][0]
+        postag1 = doc[i-1][1]
+        features.extend([
+            '-1:word.lower=' + word1.lower(),
+            '-1:word.istitle=%s' % word1.istitle(),
+            '-1:word.isupper=%s' % word1.isupper(),
+            '-1:word.isdigit=%s' % word1.isdigit(),
+            '-1:postag=' + postag1
+        ])
+    else:
+        # Indicate that it is the 'beginning of a document'
+        features.append('BOS')
+
+    # Features for words that are not
+    # at the end of a document
+    if i < len(doc)-1:
+        word1 = doc[i+1][0]
+        postag1 = doc[i+1][1]
+        features.extend([
+            '+1:word.lower=' + word1.lower(),
+            '+1:word.istitle=%s' % word1.istitle(),
+            '+1:word.isupper=%s' % word1.isupper(),
+            '+1:word.isdigit=%s' % word1.isdigit(),
+            '+1:postag=' + postag1
+        ])
+    else:
+        # Indicate that it is the 'end of a document'
+        features.append('EOS')
+
+    return features
+
+
+def word2features_dict(doc, i):
+    word = doc[i][0]
+    postag = doc[i][1]
+
+    features = {
+        'bias': 1.0,
+        'word.lower()': word.lower(),
+        'word[-3:]': word[-3:],
+        'word[-2:]': word[-2:],
+        'word.isupper()': word.isupper(),
+        'word.istitle()': word.istitle(),
+        'word.isdigit()': word.isdigit(),
+        'postag': postag
+    }
+    if i > 0:
+        word1 = doc[i-1][0]
+        postag1 = doc[i-1][1]
+        features.update({
+            '-1:word.lower()': word1.lower(),
+            '-1:word.istitle()': word1.istitle(),
+            '-1:word.isupper()': word1.isupper(),
+            '-1:postag': postag1
+        })
+    else:
+        features['BOS'] = True
+
+    if i < len(doc)-1:
+        word1 = doc[i+1][0]
+        postag1 = doc[i+1][1]
+        features.update({
+            '+1:word.lower()': word1.lower(),
+            '+1:word.istitle()': word1.istitle(),
+            '+1:word.isupper()': word1.isupper(),
+            '+1:postag': postag1
+        })
+    else:
+        features['EOS'] = True
+
+    return features
+
+
+def extract_features(doc):
+    """
+    Returns word2features(doc, i) for every token of the document.
+    """
+    words = [token[0] for token in doc]
+    postags = [token[1] for token in doc]
+    lower = [word.lower() for word in words]
+    isupper = [str(word.isupper()) for word in words]
+    istitle = [str(word.istitle()) for word in words]
+    isdigit = [str(word.isdigit()) for word in words]
+
+    # features every token gives to itself and to its neighbours
+    own = [['bias', 'word.lower=' + l, 'word[-3:]=' + w[-3:], 'word[-2:]=' + w[-2:],
+            'word.isupper=' + u, 'word.istitle=' + t, 'word.isdigit=' + d, 'postag=' + p]
+           for w, l, u, t, d, p in zip(words, lower, isupper, istitle, isdigit, postags)]
+    left = [['-1:word.lower=' + l, '-1:word.istitle=' + t, '-1:word.isupper=' + u,
+             '-1:word.isdigit=' + d, '-1:postag=' + p]
+            for l, u, t, d, p in zip(lower, isupper, istitle, isdigit, postags)]
+    right = [['+1:word.lower=' + l, '+1:word.istitle=' + t, '+1:word.isupper=' + u,
+              '+1:word.isdigit=' + d, '+1:postag=' + p]
+             for l, u, t, d, p in zip(lower, isupper, istitle, isdigit, postags)]
+
+    last = len(doc) - 1
+    features = []
+    for i, token_features in enumerate(own):
+        token_features += left[i-1] if i > 0 else ['BOS']
+        token_features += right[i+1] if i < last else ['EOS']
+        features.append(token_features)
+    return features
+
+
+def extract_features_dict(doc):
+    """
+    Returns word2features_dict(doc, i) for every token of the document.
+    """
+    words = [token[0] for token in doc]
+    postags = [token[1] for token in doc]
+    lower = [word.lower() for word in words]
+    isupper = [word.isupper() for word in words]
+    istitle = [word.istitle() for word in words]
+    isdigit = [word.isdigit() for word in words]
+
+    last = len(doc) - 1
+    features = []
+    for i, word in enumerate(words):
+        token_features = {
+            'bias': 1.0,
+            'word.lower()': lower[i],
+            'word[-3:]': word[-3:],
+            'word[-2:]': word[-2:],
+            'word.isupper()': isupper[i],
+            'word.istitle()': istitle[i],
+            'word.isdigit()': isdigit[i],
+            'postag': postags[i]
+        }
+        if i > 0:
+            token_features['-1:word.lower()'] = lower[i-1]
+            token_features['-1:word.istitle()'] = istitle[i-1]
+            token_features['-1:word.isupper()'] = isupper[i-1]
+            token_features['-1:postag'] = postags[i-1]
+        else:
+            token_features['BOS'] = True
+        if i < last:
+            token_features['+1:word.lower()'] = lower[i+1]
+            token_features['+1:word.istitle()'] = istitle[i+1]
+            token_features['+1:word.isupper()'] = isupper[i+1]
+            token_features['+1:postag'] = postags[i+1]
+        else:
+            token_features['EOS'] = True
+        features.append(token_features)
+    return features
+
+
+def extract_features_parallel(data, extract=extract_features, workers=None, chunksize=None):
+    """
+    Returns [extract(doc) for doc in data], computed in a pool of workers processes
+    (all cores by default). Documents are sent in chunks of chunksize and results
+    come back in order. extract is extract_features or extract_features_dict.
+    """
+    if workers == 1:
+        return [extract(doc) for doc in data]
+    if chunksize is None:
+        chunksize = max(1, len(data) // ((workers or os.cpu_count()) * 4))
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(extract, data, chunksize)
+
+
+def template_fingerprint(extract):
+    """
+    Returns sha1 of FEATURES_VERSION, name and source code of extract.
+    For templates from a module (like this one) the whole module source is used,
+    so changing word2features also changes fingerprint of extract_features.
+    """
+    key = hashlib.sha1(('%d %s.%s' % (FEATURES_VERSION, extract.__module__, extract.__qualname__)).encode())
+    try:
+        source = inspect.getsource(sys.modules[extract.__module__])
+    except (KeyError, TypeError, OSError):
+        #functions defined in notebook or interpreter
+        try:
+            source = inspect.getsource(extract)
+        except (TypeError, OSError):
+            source = repr(extract.__code__.co_code) + repr(extract.__code__.co_consts)
+    key.update(source.encode())
+    return key.hexdigest()
@@ -0,0 +1,117 @@
+"""
+Load test of ner_service.py: concurrent clients send /analyze requests
+over keep-alive connections and report throughput and latency percentiles
+seen by clients, then the /stats of the service (batch sizes, queue depth).
+Texts are lines of a text file, or sentences of reuters.xml documents.
+use example:
+python ner_service.py crf crf.model &
+python ner_load_test.py --port 8080 --concurrency 32 --requests 2000
+python ner_load_test.py --texts sentences.txt --texts-per-request 4
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from reuters_corpus import iter_documents
+
+
+def load_texts(filename=None, max_words=30):
+    """
+    Returns lines of filename, or reuters.xml documents cut into texts of at most max_words.
+    """
+    if filename:
+        with open(filename, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    words = [word for doc in iter_documents('reuters.xml') for word, label in doc]
+    return [' '.join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+
+
+class Connection():
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        Sends request over kept alive connection, returns status and decoded JSON.
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.writer.write(("%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+                           "Content-Length: %d\r\n\r\n" % (method, path, self.host, len(body))).encode('latin-1'))
+        self.writer.write(body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        response = json.loads(await self.reader.readexactly(int(headers['content-length'])))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def client(host, port, texts, counter, requests, texts_per_request, latencies, errors):
+    connection = Connection(host, port)
+    try:
+        while counter[0] < requests:
+            n = counter[0]
+            counter[0] += 1
+            batch = [texts[(n * texts_per_request + i) % len(texts)] for i in range(texts_per_request)]
+            start = time.perf_counter()
+            status, response = await connection.request('POST', '/analyze', {'texts': batch})
+            latencies.append(time.perf_counter() - start)
+            if status != 200 or len(response['results']) != len(batch):
+                errors.append(status)
+    finally:
+        connection.close()
+
+
+async def load_test(host, port, texts, requests=1000, concurrency=16, texts_per_request=1):
+    latencies, errors, counter = [], [], [0]
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, texts, counter, requests, texts_per_request, latencies, errors)
+                           for _ in range(concurrency)])
+    seconds = time.perf_counter() - start
+    connection = Connection(host, port)
+    try:
+        status, stats = await connection.request('GET', '/stats')
+    finally:
+        connection.close()
+    return seconds, np.array(latencies) * 1000, errors, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the NER HTTP service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--requests', type=int, default=1000, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--texts', default=None, help='file with one text per line (default: reuters.xml)')
+    parser.add_argument('--texts-per-request', type=int, default=1)
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    seconds, latencies, errors, stats = asyncio.run(load_test(args.host, args.port, texts, args.requests,
+                                                              args.concurrency, args.texts_per_request))
+    print("Requests: %d in %.1fs, %.1f requests/s, %.1f texts/s, errors: %d"
+          % (len(latencies), seconds, len(latencies) / seconds,
+             len(latencies) * args.texts_per_request / seconds, len(errors)))
+    print("Client latency ms: p50 %.1f, p90 %.1f, p95 %.1f, p99 %.1f, max %.1f"
+          % tuple(np.percentile(latencies, [50, 90, 95, 99]).tolist() + [latencies.max()]))
+    print("Service stats:", json.dumps(stats, indent=2))
@@ -0,0 +1,298 @@
+"""
+Local HTTP service for NER with the CRF or the LSTM model.
+The model is loaded once, concurrent requests are put in a queue and
+coalesced into micro-batches: a batch is tagged when it has max_batch_size
+texts or when its first text waited max_latency_ms, whichever comes first.
+The CRF backend keeps one nltk PerceptronTagger for POS tags (nltk.pos_tag
+would build it and look up its model file on every call), LSTM batches go
+through Sequence.analyze_batch.
+Endpoints:
+POST /analyze  {"text": "..."} or {"texts": ["...", ...]} gives words and
+               entities (text, type, score, beginOffset, endOffset) of every text
+GET /stats     request latency percentiles, queue depth and batch sizes
+GET /health
+use example:
+python ner_service.py crf crf.model --port 8080 --max-batch-size 32 --max-latency-ms 10
+python ner_service.py crf crf_compact.npz
+python ner_service.py lstm weights.h5 params.json preprocessor.pickle
+curl -d '{"text": "Talks in London ended"}' localhost:8080/analyze
+python ner_load_test.py --port 8080 --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import nltk
+import numpy as np
+
+from crf_compact import open_tagger
+from evaluation import entity_spans
+from features import extract_features
+
+
+class CRFBackend():
+
+    def __init__(self, model_file, outside='I'):
+        """
+        Opens model trained on extract_features of (word, postag) documents, pycrfsuite
+        file or pruned CompactCRF .npz of crf_compact.py, and loads the POS tagger,
+        both once for the lifetime of the service.
+        """
+        self.tagger = open_tagger(model_file)
+        self.pos_tagger = nltk.tag.PerceptronTagger()
+        self.outside = outside
+
+    def analyze_batch(self, texts):
+        results = []
+        for text in texts:
+            words = text.split()
+            entities = []
+            if words:
+                labels = self.tagger.tag(extract_features(self.pos_tagger.tag(words)))
+                for entity_type, begin, end in sorted(entity_spans(labels, self.outside), key=lambda span: span[1]):
+                    #marginals refer to the sequence tagged last
+                    score = np.mean([self.tagger.marginal(labels[i], i) for i in range(begin, end)])
+                    entities.append({'text': ' '.join(words[begin:end]), 'type': entity_type,
+                                     'score': float(score), 'beginOffset': begin, 'endOffset': end})
+            results.append({'words': words, 'entities': entities})
+        return results
+
+    def close(self):
+        self.tagger.close()
+
+
+class LSTMBackend():
+
+    def __init__(self, weights_file, params_file, preprocessor_file, lstm_dir=None):
+        """
+        Loads Sequence model of lstm/lstmxD.py (needs anago and keras).
+        """
+        sys.path.insert(0, lstm_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lstm'))
+        from lstmxD import Sequence
+        self.model = Sequence.load(weights_file, params_file, preprocessor_file)
+
+    def analyze_batch(self, texts):
+        return self.model.analyze_batch(texts, batch_size=max(len(texts), 1))
+
+    def close(self):
+        pass
+
+
+class _Request():
+    #results of one request, future is done when all its texts are tagged
+
+    def __init__(self, size):
+        self.future = asyncio.get_running_loop().create_future()
+        self.results = [None] * size
+        self.remaining = size
+
+    def add(self, i, result):
+        if self.future.done():
+            return
+        self.results[i] = result
+        self.remaining -= 1
+        if not self.remaining:
+            self.future.set_result(self.results)
+
+
+class MicroBatcher():
+
+    def __init__(self, backend, max_batch_size=32, max_latency_ms=10.0, window=10000):
+        """
+        Tags texts of concurrent requests together, latencies of the last window requests are kept.
+        """
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.texts = 0
+        self.max_queue_depth = 0
+        #one thread, the model is never used by two batches at once
+        self.executor = ThreadPoolExecutor(1)
+        self.queue = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.ensure_future(self._run())
+
+    async def analyze(self, texts):
+        """
+        Returns results of texts, after they are tagged in some batch.
+        """
+        start = time.perf_counter()
+        request = _Request(len(texts))
+        for i, text in enumerate(texts):
+            self.queue.put_nowait((text, request, i))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        results = await request.future if texts else []
+        self.latencies.append(time.perf_counter() - start)
+        self.requests += 1
+        return results
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await loop.run_in_executor(self.executor, self.backend.analyze_batch,
+                                                     [text for text, request, i in batch])
+            except Exception as error:
+                for text, request, i in batch:
+                    if not request.future.done():
+                        request.future.set_exception(error)
+                continue
+            self.batch_sizes.append(len(batch))
+            self.texts += len(batch)
+            #texts of one request may be split between batches
+            for (text, request, i), result in zip(batch, results):
+                request.add(i, result)
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 95, 99]).tolist() if len(latencies) else [0.0] * 4
+        return {
+            'requests': self.requests,
+            'texts': self.texts,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'latency_ms': dict(zip(['p50', 'p90', 'p95', 'p99'], percentiles),
+                               max=float(latencies.max()) if len(latencies) else 0.0),
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_latency_ms': self.max_latency * 1000,
+        }
+
+
+async def read_request(reader):
+    """
+    Returns method, path, headers and body of HTTP request, None when connection is closed.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, path, version = request_line.decode('latin-1').split(None, 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    keep_alive = version.strip() != 'HTTP/1.0' and headers.get('connection', '').lower() != 'close'
+    return method, path, headers, body, keep_alive
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\n"
+                  "Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                  % (status, status.phrase, len(body), 'keep-alive' if keep_alive else 'close')).encode('latin-1'))
+    writer.write(body)
+
+
+class NERService():
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, method, path, body):
+        #returns status and JSON payload
+        if path == '/analyze' and method == 'POST':
+            try:
+                request = json.loads(body.decode('utf-8'))
+                texts = [request['text']] if 'text' in request else request['texts']
+                #a string would be taken as a list of one character texts
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise TypeError()
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return HTTPStatus.BAD_REQUEST, {'error': 'Expected {"text": string} or {"texts": [string, ...]}'}
+            results = await self.batcher.analyze(texts)
+            return HTTPStatus.OK, {'results': results}
+        if path == '/stats' and method == 'GET':
+            return HTTPStatus.OK, self.batcher.stats()
+        if path == '/health' and method == 'GET':
+            return HTTPStatus.OK, {'status': 'ok'}
+        return HTTPStatus.NOT_FOUND, {'error': 'No such endpoint!'}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    write_response(writer, HTTPStatus.BAD_REQUEST, {'error': 'Malformed request'}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except Exception as error:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(error)}
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(backend, host='127.0.0.1', port=8080, max_batch_size=32, max_latency_ms=10.0):
+    batcher = MicroBatcher(backend, max_batch_size, max_latency_ms)
+    batcher.start()
+    service = NERService(batcher)
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print("Serving on http://%s:%d (max batch %d, max latency %.1f ms)" % (host, port, max_batch_size, max_latency_ms))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve NER model over HTTP with micro-batching.')
+    parser.add_argument('model', choices=['crf', 'lstm'])
+    parser.add_argument('files', nargs='+',
+                        help='crf: pycrfsuite or CompactCRF .npz model file; lstm: weights, params and preprocessor files')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (local only by default)')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=32, help='max number of texts tagged together')
+    parser.add_argument('--max-latency-ms', type=float, default=10.0,
+                        help='max time the first text of a batch waits for others')
+    parser.add_argument('--outside', default='I', help='crf: label of words outside named entities')
+    args = parser.parse_args()
+
+    if args.model == 'crf':
+        backend = CRFBackend(args.files[0], args.outside)
+    elif len(args.files) == 3:
+        backend = LSTMBackend(*args.files)
+    else:
+        parser.error('lstm model needs weights, params and preprocessor files')
+    try:
+        asyncio.run(serve(backend, args.host, args.port, args.max_batch_size, args.max_latency_ms))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
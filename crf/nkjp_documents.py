@@ -0,0 +1,394 @@
+"""
+NKJP documents read in a single streaming pass, shared by crf/nkjp_download.py
+and lstm/nkjp_download_2.py.
+XML_Stream parses nkjp xml files without temporary copies,
+NKJPCorpus_Document holds all annotations of one document directory,
+NKJPCorpus_Cache keeps parsed documents between runs and
+NKJPDocumentsMixin adds documents(), map_documents() and iter_* methods
+to NKJPCorpusReader of both scripts.
+use example:
+class NKJPCorpusReader(NKJPDocumentsMixin, XMLCorpusReader):
+    ...
+x = NKJPCorpusReader(root='NKJP-PodkorpusMilionowy-1.2')
+for document in x.map_documents(cache=NKJPCorpus_Cache('nkjp_cache'), workers=4):
+    print(document.named_tags('BIO'))
+"""
+import functools
+import hashlib
+import multiprocessing
+import os
+import pickle
+import re
+from xml.etree import ElementTree
+
+from cache_files import TMP_SUFFIX, CacheCounter, atomic_write
+
+NKJP_NAMESPACE = '{http://www.nkjp.pl/ns/1.0}'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+def _parse_args(fun):
+    """
+    Wraps function arguments:
+    if fileids not specified then function set NKJPCorpusReader paths.
+    """
+    @functools.wraps(fun)
+    def decorator(self, fileids=None, **kwargs):
+        if not fileids:
+            fileids = self._paths
+        return fun(self, fileids, **kwargs)
+
+    return decorator
+
+
+def _identity(document):
+    return document
+
+
+def _read_document(handle_document, cache, path):
+    if cache is None:
+        return handle_document(NKJPCorpus_Document(path)), False
+    document, hit = cache.load(path)
+    return handle_document(document), hit
+
+
+class NKJPDocumentsMixin():
+    """
+    Document level reading for NKJPCorpusReader, which has to provide
+    _paths, add_root, _view and WORDS_MODE, NE_MODE.
+    """
+
+    @_parse_args
+    def documents(self, fileids=None, cache=None, **kwargs):
+        """
+        Returns NKJPCorpus_Document for each of specified fileids.
+        Unlike words(), named_entities() and sents() every annotation file
+        of a document is parsed only once.
+        With cache (NKJPCorpus_Cache) unchanged documents are not parsed at all.
+        """
+        return list(self.iter_documents(fileids, cache=cache))
+
+    @_parse_args
+    def map_documents(self, fileids=None, handle_document=_identity, workers=1, chunksize=1, cache=None):
+        """
+        Yields handle_document(NKJPCorpus_Document) for specified fileids in their order.
+        With workers > 1 documents are read in a pool of processes,
+        so handle_document has to be a module level function.
+        With cache (NKJPCorpus_Cache) unchanged documents are loaded from it.
+        """
+        paths = [self.add_root(fileid) for fileid in fileids]
+        read_document = functools.partial(_read_document, handle_document, cache)
+        if workers <= 1:
+            results = map(read_document, paths)
+        else:
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap(read_document, paths, chunksize)
+        try:
+            for result, hit in results:
+                if cache is not None:
+                    cache.record(hit)
+                yield result
+        finally:
+            if workers > 1:
+                pool.terminate()
+
+    @_parse_args
+    def iter_words(self, fileids=None, **kwargs):
+        """
+        Yields (word, ctag) of specified fileids one by one,
+        documents are read lazily. Documents without ann_words.xml are skipped.
+        """
+        for fileid in fileids:
+            if os.path.exists(os.path.join(self.add_root(fileid), 'ann_words.xml')):
+                for word in self._view(self.add_root(fileid),
+                                       mode=self.WORDS_MODE, **kwargs).iter_query():
+                    yield word
+
+    @_parse_args
+    def iter_named_entities(self, fileids=None, **kwargs):
+        """
+        Yields (orth, type) of specified fileids one by one,
+        documents are read lazily. Documents without ann_named.xml are skipped.
+        """
+        for fileid in fileids:
+            if os.path.exists(os.path.join(self.add_root(fileid), 'ann_named.xml')):
+                for named in self._view(self.add_root(fileid),
+                                        mode=self.NE_MODE, **kwargs).iter_query():
+                    yield named
+
+    @_parse_args
+    def iter_tagged_sents(self, fileids=None, **kwargs):
+        """
+        Yields sentences of specified fileids one by one, each as list of (word, ctag)
+        without Interp (sentence boundaries of NKJPCorpus_Document.sents).
+        """
+        for fileid in fileids:
+            path = self.add_root(fileid)
+            if os.path.exists(os.path.join(path, 'ann_words.xml')):
+                for sent in XML_Stream(path, 'ann_words.xml').iterparse('.*/p/s', _handle_words_sent):
+                    yield [(word, tag) for word, tag, segments in sent]
+
+    @_parse_args
+    def iter_documents(self, fileids=None, cache=None, **kwargs):
+        """
+        Yields NKJPCorpus_Document for specified fileids one by one.
+        """
+        return self.map_documents(fileids, handle_document=_identity, cache=cache)
+
+
+class XML_Stream():
+    """
+    Helper class reading nkjp xml file in a single streaming pass.
+    Works on the original file instead of the copy built by XML_Tool:
+    tag names lose their namespace, attributes from nkjp: namespace are dropped
+    and <nkjp:paren>, <choice> wrappers are dissolved into their parent while
+    parsing, so handle_elt gets the same elements as from XMLCorpusView.
+    """
+    TRANSPARENT_TAGS = ('paren', 'choice')
+
+    def __init__(self, root, filename):
+        self.read_file = os.path.join(root, filename)
+
+    def iterparse(self, tagspec, handle_elt):
+        """
+        Yields handle_elt(elt, context) for every non-nested element
+        which tag path matches tagspec (same semantics as XMLCorpusView).
+        Elements are dropped from the tree as soon as they are handled.
+        """
+        tagspec = re.compile(tagspec + r'\Z')
+        path = []
+        stack = []
+        matched = None
+        for event, elt in ElementTree.iterparse(self.read_file, events=('start', 'end')):
+            if event == 'start':
+                elt.tag = elt.tag.rsplit('}', 1)[-1]
+                for attr in [attr for attr in elt.attrib if attr.startswith(NKJP_NAMESPACE)]:
+                    del elt.attrib[attr]
+                stack.append(elt)
+                if elt.tag in XML_Stream.TRANSPARENT_TAGS:
+                    continue
+                path.append(elt.tag)
+                if matched is None and tagspec.match('/'.join(path)):
+                    matched = elt
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if elt.tag in XML_Stream.TRANSPARENT_TAGS:
+                #put children of wrapper in its place (parser may have added next siblings already)
+                index = list(parent).index(elt)
+                parent[index:index + 1] = list(elt)
+                continue
+            context = '/'.join(path)
+            path.pop()
+            if elt is matched:
+                matched = None
+                yield handle_elt(elt, context)
+            if matched is None and parent is not None:
+                parent.remove(elt)
+
+
+def _get_targets(seg):
+    #ids pointed by <ptr> without file name, e.g. morph_1.1-seg
+    return tuple(ptr.get('target').split('#')[-1] for ptr in seg if ptr.tag == 'ptr')
+
+
+def _get_fs_values(fs):
+    #returns dictionary: f name -> string text or symbol value
+    values = dict()
+    for child in fs:
+        for symbol in child:
+            if symbol.tag == 'string':
+                values[child.get('name')] = symbol.text
+            elif 'value' in symbol.keys():
+                values[child.get('name')] = symbol.get('value')
+    return values
+
+
+def _handle_words_sent(elt, context):
+    #(orth, ctag, segment ids) of words in <s> of ann_words.xml, without Interp
+    ret = []
+    for seg in elt.findall('seg'):
+        values = _get_fs_values(seg.find('fs'))
+        if values.get('ctag') != 'Interp':
+            ret.append((values.get('orth', ''), values.get('ctag', ''), _get_targets(seg)))
+    return ret
+
+
+def _handle_named_sent(elt, context):
+    #(id, orth, type, targets) of named entities in <s> of ann_named.xml
+    ret = []
+    for seg in elt.findall('seg'):
+        values = _get_fs_values(seg.find('fs'))
+        ret.append((seg.get(XML_ID), values.get('orth', ''), values.get('type', ''),
+                    _get_targets(seg)))
+    return ret
+
+
+class NKJPCorpus_Document():
+    """
+    All annotations of one document directory in NKJP corpus, read together.
+    ann_words.xml and ann_named.xml are parsed once each:
+    words - orths of words (without Interp, as in NKJPCorpus_Words_View)
+    ctags - ctag of each word
+    segments - ann_morphosyntax.xml segment ids each word points to
+    sents - (begin, end) word indices of each sentence, end exclusive
+    named - (id, orth, type, targets) for each named entity, targets are ids
+            of segments (or nested named entities) it points to
+    Missing annotation files are read as empty, a directory without
+    ann_words.xml gives an empty document, as NKJPCorpusReader.words() does.
+    """
+    SCHEMES = ('IO', 'BIO', 'BILOU')
+    FILES = ('ann_words.xml', 'ann_named.xml')
+    #change whenever parsing changes, invalidates NKJPCorpus_Cache entries
+    PARSER_VERSION = 1
+
+    def __init__(self, filename):
+        self.fileid = filename
+        self.words = []
+        self.ctags = []
+        self.segments = []
+        self.sents = []
+        self.named = []
+        if os.path.exists(os.path.join(filename, 'ann_words.xml')):
+            for sent in XML_Stream(filename, 'ann_words.xml').iterparse('.*/p/s', _handle_words_sent):
+                begin = len(self.words)
+                for word, tag, segments in sent:
+                    self.words.append(word)
+                    self.ctags.append(tag)
+                    self.segments.append(segments)
+                self.sents.append((begin, len(self.words)))
+        if os.path.exists(os.path.join(filename, 'ann_named.xml')):
+            for sent in XML_Stream(filename, 'ann_named.xml').iterparse('.*/p/s', _handle_named_sent):
+                self.named.extend(sent)
+
+
+    def tagged_words(self):
+        """
+        Returns (word, ctag) pairs, the same as NKJPCorpusReader.words().
+        """
+        return list(zip(self.words, self.ctags))
+
+    def named_entities(self):
+        """
+        Returns (orth, type) pairs, the same as NKJPCorpusReader.named_entities().
+        """
+        return [(orth, type) for id, orth, type, targets in self.named]
+
+    def get_word_indices(self, targets, named_targets, word_index):
+        #word indices of segments pointed directly or through nested named entities
+        indices = []
+        seen = set()
+        targets = list(targets)
+        while targets:
+            target = targets.pop()
+            if target in word_index:
+                indices.append(word_index[target])
+            elif target in named_targets and target not in seen:
+                seen.add(target)
+                targets.extend(named_targets[target])
+        return indices
+
+    def named_spans(self):
+        """
+        Returns (type, begin, end) word indices of named entities, end exclusive.
+        Entities are mapped onto words through the segment ids both of them point to,
+        nested entities are dropped in favour of the ones containing them.
+        """
+        word_index = dict()
+        for index, segments in enumerate(self.segments):
+            for segment in segments:
+                word_index[segment] = index
+        named_targets = {id: targets for id, orth, type, targets in self.named}
+        spans = []
+        for id, orth, type, targets in self.named:
+            indices = self.get_word_indices(targets, named_targets, word_index)
+            if indices:
+                spans.append((min(indices), max(indices) + 1, type))
+        spans.sort(key=lambda span: (span[0], -span[1]))
+        ret = []
+        end = 0
+        for begin, span_end, type in spans:
+            if begin >= end:
+                ret.append((type, begin, span_end))
+                end = span_end
+        return ret
+
+    def named_tags(self, scheme='BIO', outside='O'):
+        """
+        Returns named entity tag of every word.
+        scheme is one of SCHEMES: 'IO' tags words with bare entity type,
+        'BIO' and 'BILOU' add B-, I-, L-, U- prefixes.
+        """
+        if scheme not in NKJPCorpus_Document.SCHEMES:
+            raise NameError('No such scheme!')
+        tags = [outside] * len(self.words)
+        for type, begin, end in self.named_spans():
+            if scheme == 'IO':
+                tags[begin:end] = [type] * (end - begin)
+            elif scheme == 'BIO' or end - begin > 1:
+                tags[begin:end] = ['B-' + type] + ['I-' + type] * (end - begin - 1)
+                if scheme == 'BILOU':
+                    tags[end - 1] = 'L-' + type
+            else:
+                tags[begin] = 'U-' + type
+        return tags
+
+class NKJPCorpus_Cache(CacheCounter):
+    """
+    Directory with pickled NKJPCorpus_Document annotations.
+    Entries are keyed by sha1 of the annotation files content and
+    NKJPCorpus_Document.PARSER_VERSION, so changed documents are parsed again
+    and the rest is loaded from cache.
+    """
+
+    def __init__(self, directory):
+        CacheCounter.__init__(self)
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def get_key(self, path):
+        key = hashlib.sha1(str(NKJPCorpus_Document.PARSER_VERSION).encode())
+        for filename in NKJPCorpus_Document.FILES:
+            filepath = os.path.join(path, filename)
+            if os.path.exists(filepath):
+                key.update(filename.encode())
+                with open(filepath, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        key.update(block)
+        return key.hexdigest()
+
+    def get_file(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def load(self, path):
+        """
+        Returns (NKJPCorpus_Document, True if it was found in cache).
+        Document is parsed and stored in cache on a miss.
+        """
+        cache_file = self.get_file(self.get_key(path))
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                state = pickle.load(f)
+            document = NKJPCorpus_Document.__new__(NKJPCorpus_Document)
+            document.__dict__.update(state)
+            document.fileid = path
+            return document, True
+        document = NKJPCorpus_Document(path)
+        atomic_write(cache_file, lambda f: pickle.dump(document.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL))
+        return document, False
+
+    def clean(self, paths=()):
+        """
+        Removes entries which do not belong to any of document paths
+        (all entries if no paths given). Returns number of removed files.
+        Temporary files of entries being written by other processes are kept.
+        """
+        keep = set(self.get_file(self.get_key(path)) for path in paths)
+        removed = 0
+        for filename in os.listdir(self.directory):
+            cache_file = os.path.join(self.directory, filename)
+            if cache_file not in keep and not filename.endswith(TMP_SUFFIX):
+                os.remove(cache_file)
+                removed += 1
+        return removed
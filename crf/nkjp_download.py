@@ -1,3 +1,4 @@
+import argparse
 import functools
 import os
 import tempfile
@@ -10,21 +11,12 @@ import re
 import numpy as np
 import pickle
 
-def _parse_args(fun):
-    """
-    Wraps function arguments:
-    if fileids not specified then function set NKJPCorpusReader paths.
-    """
-    @functools.wraps(fun)
-    def decorator(self, fileids=None, **kwargs):
-        if not fileids:
-            fileids = self._paths
-        return fun(self, fileids, **kwargs)
-
-    return decorator
+from corpus_columns import ColumnWriter
+from nkjp_documents import (NKJPCorpus_Cache, NKJPCorpus_Document, NKJPDocumentsMixin, XML_Stream,
+                            _parse_args)
 
 
-class NKJPCorpusReader(XMLCorpusReader):
+class NKJPCorpusReader(NKJPDocumentsMixin, XMLCorpusReader):
     WORDS_MODE = 0
     NE_MODE = 1
 
@@ -70,9 +62,9 @@ class NKJPCorpusReader(XMLCorpusReader):
         """
         mode = kwargs.pop('mode', NKJPCorpusReader.WORDS_MODE)
         if mode is NKJPCorpusReader.WORDS_MODE:
-            return NKJPCorpus_Words_View(filename)
+            return NKJPCorpus_Words_View(filename, **kwargs)
         elif mode is NKJPCorpusReader.NE_MODE:
-            return NKJPCorpus_Named_View(filename)
+            return NKJPCorpus_Named_View(filename, **kwargs)
 
         else:
             raise NameError('No such mode!')
@@ -112,7 +104,6 @@ class NKJPCorpusReader(XMLCorpusReader):
                                   mode=NKJPCorpusReader.NE_MODE, **kwargs).handle_query()
                        for fileid in fileids])
 
-
 class XML_Tool():
     """
     Helper class creating xml file to one without references to nkjp: namespace.
@@ -162,10 +153,29 @@ class NKJPCorpus_Words_View(XMLCorpusView):
 
     def __init__(self, filename, **kwargs):
         self.tagspec = '.*/seg/fs'
-        self.xml_tool = XML_Tool(filename, 'ann_words.xml')
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        #preprocess=True goes through temporary file built by XML_Tool
+        self.preprocess = kwargs.pop('preprocess', False)
+        if self.preprocess:
+            self.xml_tool = XML_Tool(filename, 'ann_words.xml')
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'ann_words.xml')
+
+    def iter_query(self):
+        """
+        Yields records one by one instead of returning the whole list.
+        """
+        if self.preprocess:
+            for part in self.handle_query():
+                yield part
+            return
+        for part in self.xml_stream.iterparse(self.tagspec, self.handle_elt):
+            if part is not None:
+                yield part
 
     def handle_query(self):
+        if not self.preprocess:
+            return list(self.iter_query())
         try:
             self._open()
             words = []
@@ -214,10 +224,29 @@ class NKJPCorpus_Named_View(XMLCorpusView):
 
     def __init__(self, filename, **kwargs):
         self.tagspec = '.*/seg/fs'
-        self.xml_tool = XML_Tool(filename, 'ann_named.xml')
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        #preprocess=True goes through temporary file built by XML_Tool
+        self.preprocess = kwargs.pop('preprocess', False)
+        if self.preprocess:
+            self.xml_tool = XML_Tool(filename, 'ann_named.xml')
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'ann_named.xml')
+
+    def iter_query(self):
+        """
+        Yields records one by one instead of returning the whole list.
+        """
+        if self.preprocess:
+            for part in self.handle_query():
+                yield part
+            return
+        for part in self.xml_stream.iterparse(self.tagspec, self.handle_elt):
+            if part is not None:
+                yield part
 
     def handle_query(self):
+        if not self.preprocess:
+            return list(self.iter_query())
         try:
             self._open()
             words = []
@@ -255,26 +284,54 @@ class NKJPCorpus_Named_View(XMLCorpusView):
                         tag = symbol_tag.attrib['value']
         if is_not_interp:
             return (word, tag)
-    
+
+
+def label_document(document, scheme='IO', outside='I'):
+    """
+    Returns (word, ctag, label) for every word of NKJPCorpus_Document and its sentence boundaries.
+    Labels come from named entity spans, see NKJPCorpus_Document.named_tags.
+    """
+    word_data = []
+    for (word, tag), label in zip(document.tagged_words(), document.named_tags(scheme, outside)):
+        word_data.append((word, tag, label))
+    return word_data, document.sents
+
 if __name__ == "__main__":
-    x = NKJPCorpusReader(root='NKJP-PodkorpusMilionowy-1.2') # obtain the whole corpus
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='NKJP-PodkorpusMilionowy-1.2')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes reading documents')
+    parser.add_argument('--scheme', default='IO', choices=NKJPCorpus_Document.SCHEMES,
+                        help='named entity tagging scheme')
+    parser.add_argument('--cache', help='directory with parsed documents reused between runs')
+    parser.add_argument('--clean-cache', action='store_true',
+                        help='remove cache entries of changed or removed documents and exit')
+    parser.add_argument('--columns', help='also write columnar corpus (see corpus_columns.py) to this directory')
+    args = parser.parse_args()
+
+    x = NKJPCorpusReader(root=args.root) # obtain the whole corpus
+    cache = NKJPCorpus_Cache(args.cache) if args.cache else None
+    if args.clean_cache:
+        if cache is None:
+            parser.error('--clean-cache requires --cache')
+        print("Removed %d cache entries" % cache.clean(x._paths))
+        raise SystemExit
     fileids = x.fileids()
+    #bare 'I' marks words outside entities only in the notebook compatible IO scheme,
+    #in BIO and BILOU it would be mistaken for inside
+    outside = 'I' if args.scheme == 'IO' else 'O'
+    handle_document = functools.partial(label_document, scheme=args.scheme, outside=outside)
     all_word_data = []
-    for fileid in fileids:
-        x = NKJPCorpusReader(root='NKJP-PodkorpusMilionowy-1.2', fileids=fileid.split("/")[0])
-        names = x.named_entities()
-        words = x.words()
-        word_data = []
-        named_data = []
-        for named, name in names:
-            for val in re.split('\s+', named):
-                named_data.append((val, name))
-        for word, tag in words:
-            label = next((name for ind, (named, name) in enumerate(named_data) if named == word), 'I')
-            word_data.append((word, tag, label))
+    column_writer = ColumnWriter(args.columns) if args.columns else None
+    for fileid, (word_data, sents) in zip(fileids, x.map_documents(handle_document=handle_document,
+                                                          workers=args.workers, cache=cache)):
         all_word_data.append(word_data)
+        if column_writer is not None:
+            column_writer.append(word_data, sents)
         print("Words in " + fileid + " " + str(len(word_data)))
     print(str(len(all_word_data)))
+    if cache is not None:
+        print(cache.stats())
     with open('word_data_file.obj', 'wb') as words_object:
         pickle.dump(all_word_data, words_object)
-            
+    if column_writer is not None:
+        column_writer.close()
@@ -0,0 +1,113 @@
+"""
+POS tagging of documents in batches with results cached on disk.
+nltk.pos_tag and nltk.pos_tag_sents build a new PerceptronTagger and look up
+its model file on every call (the pickle itself is cached by nltk.data.load),
+here the tagger is built once per process (get_tagger) and reused for all batches.
+Tags are cached by sha1 of document tokens and TAGGER_VERSION, so unchanged
+documents are never tagged again, identical documents are tagged once.
+use example:
+cache = PosTagCache('pos_tags.pickle')
+tags = pos_tag_documents([[w for w, label in doc] for doc in docs], cache)
+"""
+import hashlib
+import multiprocessing
+import os
+import pickle
+
+import nltk
+
+from cache_files import CacheCounter, atomic_write
+
+TAGGER_VERSION = 'nltk %s averaged_perceptron_tagger' % nltk.__version__
+
+_tagger = None
+
+
+def _document_key(tokens):
+    key = hashlib.sha1(TAGGER_VERSION.encode())
+    key.update('\0'.join(tokens).encode('utf-8'))
+    return key.hexdigest()
+
+
+def get_tagger():
+    """
+    Returns nltk.tag.PerceptronTagger of this process, built on the first call.
+    """
+    global _tagger
+    if _tagger is None:
+        _tagger = nltk.tag.PerceptronTagger()
+    return _tagger
+
+
+def _tag_batch(documents):
+    #only tags are kept, words are known to the caller
+    tagger = get_tagger()
+    return [[pos for word, pos in tagger.tag(tokens)] for tokens in documents]
+
+
+class PosTagCache(CacheCounter):
+    """
+    Pickled dict of document key -> list of POS tags, loaded once and saved after tagging.
+    """
+
+    def __init__(self, filename):
+        CacheCounter.__init__(self, 'POS tag cache')
+        self.filename = filename
+        self.changed = False
+        self.tags = {}
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                self.tags = pickle.load(f)
+
+    def get(self, key):
+        tags = self.tags.get(key)
+        self.record(tags is not None)
+        return tags
+
+    def put(self, key, tags):
+        self.tags[key] = tags
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        atomic_write(self.filename, lambda f: pickle.dump(self.tags, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.changed = False
+
+
+def pos_tag_documents(documents, cache=None, batch_size=64, workers=1):
+    """
+    Returns list of POS tags for every document (list of tokens), in order.
+    Documents missing in cache are tagged with get_tagger() in batches
+    of batch_size documents, in a pool of workers processes if workers > 1.
+    """
+    documents = list(documents)
+    tags = [None] * len(documents)
+    keys = [_document_key(tokens) for tokens in documents]
+    if cache is not None:
+        for i, key in enumerate(keys):
+            tags[i] = cache.get(key)
+    #documents with the same key are tagged once
+    missing = {}
+    for i, document_tags in enumerate(tags):
+        if document_tags is None:
+            missing.setdefault(keys[i], []).append(i)
+    missing = list(missing.values())
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    inputs = ([documents[same[0]] for same in batch] for batch in batches)
+
+    pool = multiprocessing.Pool(workers) if workers > 1 and len(batches) > 1 else None
+    try:
+        tagged_batches = pool.imap(_tag_batch, inputs) if pool is not None else map(_tag_batch, inputs)
+        for batch, tagged in zip(batches, tagged_batches):
+            for same, document_tags in zip(batch, tagged):
+                for i in same:
+                    tags[i] = document_tags
+                if cache is not None:
+                    cache.put(keys[same[0]], document_tags)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if cache is not None:
+        cache.save()
+    return tags
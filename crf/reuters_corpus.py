@@ -0,0 +1,46 @@
+"""
+Streaming reader of reuters.xml (Reuters-21578 with named entities).
+Document elements are parsed incrementally and cleared after use,
+so memory does not grow with the size of the file.
+Every document is a list of (word, label), label is 'N' for words of
+NamedEntityInText and 'I' for other words, the same as crf_test.py got
+from BeautifulSoup with html5lib parser.
+use example:
+docs = list(iter_documents('reuters.xml'))
+"""
+from xml.etree import ElementTree
+
+
+def _local_name(tag):
+    #tag without namespace, {http://semweb.unister.de/xml-corpus-schema-2013}Document -> Document
+    return tag.rsplit('}', 1)[-1]
+
+
+def _handle_document(elt):
+    texts = []
+    for text in elt:
+        if _local_name(text.tag) != 'TextWithNamedEntities':
+            continue
+        for c in text:
+            if _local_name(c.tag) == 'NamedEntityInText':
+                label = "N"  # part of a named entity
+            else:
+                label = "I"  # irrelevant word
+            for w in ''.join(c.itertext()).split(" "):
+                if len(w) > 0:
+                    texts.append((w, label))
+        break
+    return texts
+
+
+def iter_documents(filename='reuters.xml'):
+    """
+    Yields list of (word, label) for every Document element of the file.
+    """
+    context = ElementTree.iterparse(filename, events=('start', 'end'))
+    event, root = next(context)
+    for event, elt in context:
+        if event == 'end' and _local_name(elt.tag) == 'Document':
+            yield _handle_document(elt)
+            #drop finished documents, root keeps no children
+            root.clear()
@@ -0,0 +1,40 @@
+"""
+Compares epoch time of Sequence.fit with batch_size=1 (as in lstmxD.py before)
+and with bucketed batches of similar length sentences.
+use example:
+python benchmark_bucketing.py data.txt 32
+"""
+import sys
+import time
+
+from lstmxD import Sequence, BucketedSequence, load_data_and_labels
+
+
+def epoch_time(x, y, epochs=1, **kwargs):
+    model = Sequence()
+    start = time.perf_counter()
+    model.fit(x, y, epochs=epochs, verbose=0, **kwargs)
+    return (time.perf_counter() - start) / epochs
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'data.txt'
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    x, y = load_data_and_labels(filename)
+    x, y = zip(*[(words, tags) for words, tags in zip(x, y) if len(words)])
+    x, y = list(x), list(y)
+    print("Sentences: %d, words: %d" % (len(x), sum(len(words) for words in x)))
+
+    lengths = [len(words) for words in x]
+    unsorted = BucketedSequence(lengths, batch_size, None, bucket_size=len(x))
+    bucketed = BucketedSequence(lengths, batch_size, None)
+    print("Padding with batch_size=%d: shuffled %.1f%%, bucketed %.1f%%"
+          % (batch_size, unsorted.padding() * 100, bucketed.padding() * 100))
+
+    single = epoch_time(x, y, batch_size=1, shuffle=False)
+    print("batch_size=1:            %.1fs per epoch" % single)
+    plain = epoch_time(x, y, batch_size=batch_size)
+    print("batch_size=%d:           %.1fs per epoch" % (batch_size, plain))
+    buckets = epoch_time(x, y, batch_size=batch_size, bucketed=True)
+    print("batch_size=%d, bucketed: %.1fs per epoch" % (batch_size, buckets))
+    print("Speedup over batch_size=1: %.2fx" % (single / buckets))
@@ -0,0 +1,39 @@
+"""
+Compares sentences/s of Sequence.analyze (one model.predict per sentence)
+and Sequence.analyze_batch (sentences of similar length predicted together).
+use example:
+python benchmark_inference.py weights.h5 params.json preprocessor.pickle data.txt 64
+"""
+import sys
+import time
+
+from lstmxD import Sequence, load_data_and_labels
+
+
+def sentences_per_second(analyze, texts):
+    start = time.perf_counter()
+    results = analyze(texts)
+    return len(texts) / (time.perf_counter() - start), results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.exit("usage: python benchmark_inference.py weights_file params_file preprocessor_file [data.txt] [batch_size]")
+    model = Sequence.load(sys.argv[1], sys.argv[2], sys.argv[3])
+    filename = sys.argv[4] if len(sys.argv) > 4 else 'data.txt'
+    batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 64
+    x, _ = load_data_and_labels(filename)
+    texts = [' '.join(words) for words in x if len(words)]
+    print("Sentences: %d, words: %d" % (len(texts), sum(len(text.split()) for text in texts)))
+
+    single, single_results = sentences_per_second(lambda texts: [model.analyze(text) for text in texts], texts)
+    print("analyze:                      %.1f sentences/s" % single)
+    batched, batch_results = sentences_per_second(lambda texts: model.analyze_batch(texts, batch_size=batch_size), texts)
+    print("analyze_batch(batch_size=%d): %.1f sentences/s" % (batch_size, batched))
+    print("Speedup: %.2fx" % (batched / single))
+
+    #entities must not depend on batching, scores may differ in the last digits
+    same = sum([(e['type'], e['beginOffset'], e['endOffset']) for e in a['entities']]
+               == [(e['type'], e['beginOffset'], e['endOffset']) for e in b['entities']]
+               for a, b in zip(single_results, batch_results))
+    print("Same entities: %d of %d sentences" % (same, len(texts)))
@@ -0,0 +1,41 @@
+"""
+Compares the streaming XML_Stream path with the XML_Tool temporary file path
+on NKJP views. Both paths must return the same records.
+use example:
+python benchmark_xml_stream.py NKJP-PodkorpusMilionowy-1.2 [number_of_fileids]
+"""
+import sys
+import time
+
+from nkjp_download_2 import NKJPCorpusReader
+
+
+def read_document(root, fileid, preprocess):
+    x = NKJPCorpusReader(root=root, fileids=fileid.split("/")[0])
+    return (x.words(preprocess=preprocess),
+            x.named_entities(preprocess=preprocess),
+            x.sents(['/' + fileid], preprocess=preprocess))
+
+
+def run(root, fileids, preprocess):
+    start = time.perf_counter()
+    records = [read_document(root, fileid, preprocess) for fileid in fileids]
+    return records, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else 'NKJP-PodkorpusMilionowy-1.2'
+    fileids = NKJPCorpusReader(root=root).fileids()
+    if len(sys.argv) > 2:
+        fileids = fileids[:int(sys.argv[2])]
+
+    preprocessed, preprocessed_time = run(root, fileids, preprocess=True)
+    streamed, streamed_time = run(root, fileids, preprocess=False)
+    if preprocessed != streamed:
+        raise AssertionError('XML_Stream records differ from XML_Tool records')
+
+    words = sum(len(words) for words, names, sents in streamed)
+    print("Documents: %d, words: %d" % (len(fileids), words))
+    print("XML_Tool (temporary files): %.2fs" % preprocessed_time)
+    print("XML_Stream (streaming):     %.2fs" % streamed_time)
+    print("Speedup: %.2fx" % (preprocessed_time / streamed_time))
@@ -19,13 +19,102 @@ from keras.layers import Dense, Activation
 """
 Wrapper class.
 """
+import functools
+import glob
+import hashlib
+import math
+import os
+import random
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+from keras.utils import Sequence as KerasSequence
 from seqeval.metrics import f1_score
+from seqeval.metrics.sequence_labeling import get_entities
 
+from anago.callbacks import F1score
 from anago.models import BiLSTMCRF
 from anago.preprocessing import IndexTransformer
 from anago.tagger import Tagger
 from anago.trainer import Trainer
-from anago.utils import filter_embeddings
+from anago.utils import filter_embeddings, NERSequence
+
+
+def _transform_batch(p, x, y, indices):
+    return p.transform([x[i] for i in indices], [y[i] for i in indices])
+
+
+class BucketedSequence(KerasSequence):
+    """Batches of sentences of similar length.
+
+    Sentences are sorted by length and split into buckets of
+    `bucket_size` batches. Every epoch sentences are shuffled within
+    their bucket and batches are shuffled, so a batch is padded only
+    to the longest of sentences of similar length.
+
+    Attributes:
+        lengths: list of sentence lengths.
+        batch_size: Integer. Number of sentences per batch.
+        get_batch: function, returns model input and target for list of sentence indices.
+    """
+
+    def __init__(self, lengths, batch_size, get_batch, bucket_size=8, shuffle=True, seed=None):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.get_batch = get_batch
+        self.shuffle = shuffle
+        self.random = random.Random(seed)
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        span = batch_size * bucket_size
+        self.buckets = [order[i:i + span] for i in range(0, len(order), span)]
+        self.on_epoch_end()
+
+    def on_epoch_end(self):
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = bucket[:]
+                self.random.shuffle(bucket)
+            batches.extend(bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size))
+        if self.shuffle:
+            self.random.shuffle(batches)
+        self.batches = batches
+
+    def __getitem__(self, idx):
+        return self.get_batch(self.batches[idx])
+
+    def __len__(self):
+        return len(self.batches)
+
+    def padding(self):
+        """Returns fraction of padded word positions in the batches."""
+        padded = total = 0
+        for batch in self.batches:
+            lengths = [self.lengths[i] for i in batch]
+            padded += max(lengths) * len(lengths) - sum(lengths)
+            total += max(lengths) * len(lengths)
+        return padded / total if total else 0.0
+
+
+def train_on_batches(model, p, train_seq, valid_seq=None, epochs=1, verbose=1,
+                     callbacks=None, steps_per_epoch=None):
+    """Trains the model on batches made outside of anago Trainer.
+
+    Same as `Trainer.train`, but batches are not shuffled by Keras,
+    `train_seq` shuffles them itself (or is a generator).
+    """
+    if valid_seq is not None:
+        f1 = F1score(valid_seq, preprocessor=p)
+        callbacks = [f1] + callbacks if callbacks else [f1]
+
+    model.fit_generator(generator=train_seq,
+                        steps_per_epoch=steps_per_epoch,
+                        epochs=epochs,
+                        callbacks=callbacks,
+                        verbose=verbose,
+                        shuffle=False)
 
 
 class Sequence(object):
@@ -60,7 +149,8 @@ class Sequence(object):
         self.optimizer = optimizer
 
     def fit(self, x_train, y_train, x_valid=None, y_valid=None,
-            epochs=1, batch_size=32, verbose=1, callbacks=None, shuffle=True):
+            epochs=1, batch_size=32, verbose=1, callbacks=None, shuffle=True,
+            bucketed=False):
         """Fit the model for a fixed number of epochs.
 
         Args:
@@ -78,9 +168,87 @@ class Sequence(object):
                 List of callbacks to apply during training.
             shuffle: Boolean (whether to shuffle the training data
                 before each epoch). `shuffle` will default to True.
+            bucketed: Boolean. Whether to batch sentences of similar
+                length together (see `BucketedSequence`).
         """
         p = IndexTransformer(initial_vocab=self.initial_vocab, use_char=self.use_char)
         p.fit(x_train, y_train)
+        model = self._build_model(p)
+
+        if bucketed:
+            train_seq = BucketedSequence([len(x) for x in x_train], batch_size,
+                                         functools.partial(_transform_batch, p, x_train, y_train),
+                                         shuffle=shuffle)
+            valid_seq = None
+            if x_valid and y_valid:
+                valid_seq = NERSequence(x_valid, y_valid, batch_size, p.transform)
+            train_on_batches(model, p, train_seq, valid_seq,
+                             epochs=epochs, verbose=verbose, callbacks=callbacks)
+        else:
+            trainer = Trainer(model, preprocessor=p)
+            trainer.train(x_train, y_train, x_valid, y_valid,
+                          epochs=epochs, batch_size=batch_size,
+                          verbose=verbose, callbacks=callbacks,
+                          shuffle=shuffle)
+
+        self.p = p
+        self.model = model
+
+    def fit_stream(self, filenames, x_valid=None, y_valid=None,
+                   epochs=1, batch_size=32, verbose=1, callbacks=None, shuffle=True,
+                   shuffle_buffer=10000, bucketed=True, cache=None):
+        """Fit the model on sentences read lazily from TSV files.
+
+        Only the vocabulary and `shuffle_buffer` sentences are kept in memory,
+        so memory does not depend on the size of the corpus.
+        With `cache` the fitted transformer and the id arrays of the corpus are
+        loaded from it (made on the first run), sentences are not tokenised again.
+
+        Args:
+            filenames: path, glob pattern or list of paths of TSV shard files
+                in `load_data_and_labels` format.
+            x_valid: list of validation data.
+            y_valid: list of validation target (label) data.
+            epochs: Integer. Number of epochs to train the model.
+            batch_size: Integer. Number of samples per gradient update.
+            verbose: Integer. 0, 1, or 2. Verbosity mode.
+            callbacks: List of `keras.callbacks.Callback` instances.
+            shuffle: Boolean. Whether to shuffle sentences within the buffer.
+            shuffle_buffer: Integer. Number of sentences read ahead and shuffled.
+            bucketed: Boolean. Whether to batch sentences of similar length
+                within the buffer together.
+            cache: `TransformCache` or None.
+        """
+        if cache is not None:
+            p = cache.load_transformer(filenames, self.initial_vocab, self.use_char)
+        else:
+            corpus = TSVCorpus(filenames)
+            p = IndexTransformer(initial_vocab=self.initial_vocab, use_char=self.use_char)
+            p.fit(corpus.words(), corpus.tags())
+        model = self._build_model(p)
+
+        valid_seq = None
+        if x_valid and y_valid:
+            valid_seq = NERSequence(x_valid, y_valid, batch_size, p.transform)
+        if cache is not None:
+            indexed = cache.load_corpus(filenames, p)
+            lengths = indexed.lengths().tolist()
+            #a single bucket is plain shuffling
+            batches = BucketedSequence(lengths, batch_size, indexed.batch, shuffle=shuffle,
+                                       bucket_size=8 if bucketed else len(lengths))
+            train_on_batches(model, p, batches, valid_seq,
+                             epochs=epochs, verbose=verbose, callbacks=callbacks)
+        else:
+            batches = stream_batches(corpus, batch_size, p.transform, shuffle=shuffle,
+                                     shuffle_buffer=shuffle_buffer, bucketed=bucketed)
+            train_on_batches(model, p, batches, valid_seq,
+                             epochs=epochs, verbose=verbose, callbacks=callbacks,
+                             steps_per_epoch=math.ceil(len(corpus) / batch_size))
+
+        self.p = p
+        self.model = model
+
+    def _build_model(self, p):
         embeddings = filter_embeddings(self.embeddings, p._word_vocab.vocab, self.word_embedding_dim)
 
         model = BiLSTMCRF(char_vocab_size=p.char_vocab_size,
@@ -98,14 +266,7 @@ class Sequence(object):
         model.build()
         model.compile(loss=model.get_loss(), optimizer=self.optimizer)
 
-        trainer = Trainer(model, preprocessor=p)
-        trainer.train(x_train, y_train, x_valid, y_valid,
-                      epochs=epochs, batch_size=batch_size,
-                      verbose=verbose, callbacks=callbacks,
-                      shuffle=shuffle)
-
-        self.p = p
-        self.model = model
+        return model
 
     def score(self, x_test, y_test):
         """Returns the f1-micro score on the given test data and labels.
@@ -130,6 +291,39 @@ class Sequence(object):
         else:
             raise OSError('Could not find a model. Call load(dir_path).')
 
+    def score_file(self, filenames, batch_size=32, cache=None):
+        """Returns the f1-micro score on sentences of TSV files.
+
+        Args:
+            filenames: path, glob pattern or list of paths of TSV shard files.
+            batch_size: Integer. Number of sentences per prediction.
+            cache: `TransformCache` or None. With cache sentences are
+                mapped to ids only on the first call.
+
+        Returns:
+            score : float, f1-micro score.
+        """
+        if not self.model:
+            raise OSError('Could not find a model. Call load(dir_path).')
+        label_true, label_pred = [], []
+        if cache is not None:
+            indexed = cache.load_corpus(filenames, self.p)
+            lengths = indexed.lengths()
+            for begin in range(0, len(indexed), batch_size):
+                indices = range(begin, min(begin + batch_size, len(indexed)))
+                x_true, y_true = indexed.batch(indices)
+                y_pred = self.model.predict(x_true)
+                label_true.extend(self.p.inverse_transform(y_true, lengths[begin:indices.stop]))
+                label_pred.extend(self.p.inverse_transform(y_pred, lengths[begin:indices.stop]))
+        else:
+            sentences = iter(TSVCorpus(filenames))
+            for chunk in iter(lambda: [sent for _, sent in zip(range(batch_size), sentences)], []):
+                words, tags = zip(*chunk)
+                y_pred = self.model.predict(self.p.transform(words))
+                label_true.extend(list(sent) for sent in tags)
+                label_pred.extend(self.p.inverse_transform(y_pred, [len(sent) for sent in words]))
+        return f1_score(label_true, label_pred)
+
     def analyze(self, text, tokenizer=str.split):
         """Analyze text and return pretty format.
 
@@ -147,6 +341,65 @@ class Sequence(object):
 
         return self.tagger.analyze(text)
 
+    def predict_proba_batch(self, sentences, batch_size=64):
+        """Returns label probabilities of tokenized sentences.
+
+        Sentences are sorted by length and predicted `batch_size` at a time,
+        so a batch is padded only to the longest of similar sentences.
+
+        Args:
+            sentences: list of word lists.
+            batch_size: Integer. Number of sentences per `model.predict` call.
+
+        Returns:
+            y: list of arrays, shape = [num_words, num_classes], in input order.
+        """
+        if not self.model:
+            raise OSError('Could not find a model. Call load(dir_path).')
+        num_classes = self.p.label_size
+        y = [np.zeros((0, num_classes)) for _ in sentences]
+        order = sorted((i for i, words in enumerate(sentences) if len(words)), key=lambda i: len(sentences[i]))
+        for begin in range(0, len(order), batch_size):
+            indices = order[begin:begin + batch_size]
+            pred = self.model.predict(self.p.transform([sentences[i] for i in indices]))
+            for i, sent_pred in zip(indices, pred):
+                y[i] = sent_pred[:len(sentences[i])]
+        return y
+
+    def predict_batch(self, texts, tokenizer=str.split, batch_size=64):
+        """Predict labels of many texts.
+
+        Args:
+            texts: list of strings.
+            tokenizer: Tokenize input sentence. Default tokenizer is `str.split`.
+            batch_size: Integer. Number of sentences per `model.predict` call.
+
+        Returns:
+            tags: list of label lists, in input order.
+        """
+        sentences = [tokenizer(text) for text in texts]
+        return [self.p.inverse_transform([pred])[0] if len(pred) else []
+                for pred in self.predict_proba_batch(sentences, batch_size)]
+
+    def analyze_batch(self, texts, tokenizer=str.split, batch_size=64):
+        """Analyze many texts, as `analyze` gives for every one of them.
+
+        Args:
+            texts: list of strings.
+            tokenizer: Tokenize input sentence. Default tokenizer is `str.split`.
+            batch_size: Integer. Number of sentences per `model.predict` call.
+
+        Returns:
+            res: list of dicts with words and entities (text, type, score,
+                beginOffset, endOffset), in input order.
+        """
+        sentences = [tokenizer(text) for text in texts]
+        results = []
+        for words, pred in zip(sentences, self.predict_proba_batch(sentences, batch_size)):
+            tags = self.p.inverse_transform([pred])[0] if len(pred) else []
+            results.append(build_response(words, tags, np.max(pred, -1)))
+        return results
+
     def save(self, weights_file, params_file, preprocessor_file):
         self.p.save(preprocessor_file)
         self.model.save(weights_file, params_file)
@@ -160,6 +413,33 @@ class Sequence(object):
         return self
 
 
+def build_response(words, tags, prob):
+    """Returns words and entities of a sentence, in the format of `Tagger.analyze`.
+
+    Args:
+        words: list of words.
+        tags: list of predicted labels.
+        prob: array of probabilities of predicted labels.
+
+    Returns:
+        res: dict.
+    """
+    res = {
+        'words': words,
+        'entities': []
+    }
+    for chunk_type, chunk_start, chunk_end in get_entities(tags):
+        chunk_end += 1
+        res['entities'].append({
+            'text': ' '.join(words[chunk_start:chunk_end]),
+            'type': chunk_type,
+            'score': float(np.average(prob[chunk_start:chunk_end])),
+            'beginOffset': chunk_start,
+            'endOffset': chunk_end
+        })
+    return res
+
+
 def load_data_and_labels(filename):
     """Loads data and label from a file.
 
@@ -212,6 +492,268 @@ def load_data_and_labels(filename):
     return sents, labels
 
 
+def iter_data_and_labels(filenames):
+    """Yields sentences of TSV files one by one.
+
+    Same format as `load_data_and_labels`, empty sentences are skipped.
+
+    Args:
+        filenames: path, glob pattern or list of paths of shard files.
+
+    Yields:
+        tuple(list, list): words and labels of a sentence.
+    """
+    for filename in _shard_files(filenames):
+        words, tags = [], []
+        with open(filename) as f:
+            for line in f:
+                line = line.rstrip()
+                if line:
+                    word, tag = line.split('\t')
+                    if word and tag:
+                        words.append(word)
+                        tags.append(tag)
+                elif words:
+                    yield words, tags
+                    words, tags = [], []
+        if words:
+            yield words, tags
+
+
+def _shard_files(filenames):
+    if isinstance(filenames, str):
+        return sorted(glob.glob(filenames)) or [filenames]
+    return list(filenames)
+
+
+class TSVCorpus(object):
+    """Sentences of TSV shard files, read again on every iteration.
+
+    Attributes:
+        filenames: list of paths of shard files.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = _shard_files(filenames)
+        self._length = None
+
+    def __iter__(self):
+        return iter_data_and_labels(self.filenames)
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self)
+        return self._length
+
+    def words(self):
+        """Returns iterable of sentence words (for `IndexTransformer.fit`)."""
+        return _TSVColumn(self, 0)
+
+    def tags(self):
+        """Returns iterable of sentence labels."""
+        return _TSVColumn(self, 1)
+
+
+class _TSVColumn(object):
+
+    def __init__(self, corpus, index):
+        self.corpus = corpus
+        self.index = index
+
+    def __iter__(self):
+        return (sent[self.index] for sent in self.corpus)
+
+
+def stream_batches(corpus, batch_size, preprocess, shuffle=True, shuffle_buffer=10000,
+                   bucketed=True, seed=None):
+    """Yields batches of corpus epoch after epoch, for `fit_generator`.
+
+    Sentences are read into a buffer of `shuffle_buffer` sentences, which is
+    shuffled (and sorted by length if bucketed) and cut into batches.
+    Every epoch gives `ceil(len(corpus) / batch_size)` batches.
+
+    Args:
+        corpus: iterable of (words, labels), e.g. `TSVCorpus`.
+        batch_size: Integer. Number of sentences per batch.
+        preprocess: function making model input and target of words and labels.
+    """
+    rnd = random.Random(seed)
+    #whole batches in buffer, so only the last batch of an epoch is smaller
+    buffer_size = max(1, shuffle_buffer // batch_size) * batch_size
+    while True:
+        buffer = []
+        for sent in corpus:
+            buffer.append(sent)
+            if len(buffer) == buffer_size:
+                for batch in _buffer_batches(buffer, batch_size, shuffle, bucketed, rnd):
+                    yield preprocess(*zip(*batch))
+                buffer = []
+        for batch in _buffer_batches(buffer, batch_size, shuffle, bucketed, rnd):
+            yield preprocess(*zip(*batch))
+
+
+def _buffer_batches(buffer, batch_size, shuffle, bucketed, rnd):
+    if shuffle:
+        rnd.shuffle(buffer)
+    if bucketed:
+        buffer.sort(key=lambda sent: len(sent[0]))
+    batches = [buffer[i:i + batch_size] for i in range(0, len(buffer), batch_size)]
+    if shuffle:
+        rnd.shuffle(batches)
+    return batches
+
+
+class IndexedCorpus(object):
+    """Sentences mapped to ids by `IndexTransformer`, memory mapped from .npy files.
+
+    Directory holds `word_ids`, `label_ids` and `char_ids` of all words one
+    after another, `sent_offsets` (word offset of every sentence) and
+    `char_offsets` (char offset of every word), plus number of labels.
+
+    Attributes:
+        directory: path of the directory.
+        label_size: Integer. Number of labels of the transformer.
+        use_char: Boolean. Whether char ids are stored.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        sizes = np.load(os.path.join(directory, 'sizes.npy'))
+        self.label_size, self.use_char = int(sizes[0]), bool(sizes[1])
+        for name in ('word_ids', 'label_ids', 'sent_offsets', 'char_ids', 'char_offsets'):
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+
+    @classmethod
+    def write(cls, directory, p, corpus):
+        """Maps sentences of corpus (iterable of words and labels) to ids and saves them.
+
+        Args:
+            directory: path of the directory.
+            p: fitted `IndexTransformer`.
+            corpus: iterable of (words, labels), e.g. `TSVCorpus`.
+        """
+        ids = {name: array('q') for name in ('word_ids', 'label_ids', 'char_ids')}
+        sent_offsets, char_offsets = array('q', [0]), array('q', [0])
+        for words, tags in corpus:
+            ids['word_ids'].extend(p._word_vocab.doc2id(words))
+            ids['label_ids'].extend(p._label_vocab.doc2id(tags))
+            if p._use_char:
+                for word in words:
+                    ids['char_ids'].extend(p._char_vocab.doc2id(word))
+                    char_offsets.append(len(ids['char_ids']))
+            sent_offsets.append(len(ids['word_ids']))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for name, values in ids.items():
+            np.save(os.path.join(directory, name + '.npy'), np.frombuffer(values, dtype=np.int64).astype(np.int32))
+        np.save(os.path.join(directory, 'sent_offsets.npy'), np.frombuffer(sent_offsets, dtype=np.int64))
+        np.save(os.path.join(directory, 'char_offsets.npy'), np.frombuffer(char_offsets, dtype=np.int64))
+        np.save(os.path.join(directory, 'sizes.npy'), np.array([p.label_size, p._use_char], dtype=np.int64))
+        return cls(directory)
+
+    def __len__(self):
+        return len(self.sent_offsets) - 1
+
+    def lengths(self):
+        return np.diff(self.sent_offsets)
+
+    def batch(self, indices):
+        """Returns model input and target of sentences, as `IndexTransformer.transform`.
+
+        Args:
+            indices: list of sentence indices.
+
+        Returns:
+            features: word id matrix (and char id tensor), padded with zeros.
+            y: one-hot label tensor.
+        """
+        begins = [int(self.sent_offsets[i]) for i in indices]
+        ends = [int(self.sent_offsets[i + 1]) for i in indices]
+        max_len = max(end - begin for begin, end in zip(begins, ends))
+        word_ids = np.zeros((len(indices), max_len), dtype=np.int32)
+        label_ids = np.zeros((len(indices), max_len), dtype=np.int32)
+        for k, (begin, end) in enumerate(zip(begins, ends)):
+            word_ids[k, :end - begin] = self.word_ids[begin:end]
+            label_ids[k, :end - begin] = self.label_ids[begin:end]
+        y = np.eye(self.label_size, dtype=int)[label_ids]
+
+        if not self.use_char:
+            return word_ids, y
+        char_offsets = [self.char_offsets[begin:end + 1] for begin, end in zip(begins, ends)]
+        max_word_len = max(int(np.diff(offsets).max()) if len(offsets) > 1 else 0 for offsets in char_offsets)
+        char_ids = np.zeros((len(indices), max_len, max_word_len), dtype=np.int32)
+        for k, offsets in enumerate(char_offsets):
+            for j in range(len(offsets) - 1):
+                char_ids[k, j, :offsets[j + 1] - offsets[j]] = self.char_ids[offsets[j]:offsets[j + 1]]
+        return [word_ids, char_ids], y
+
+
+class TransformCache(object):
+    """Directory of fitted transformers and `IndexedCorpus` arrays.
+
+    Transformers are keyed by sha1 of the data files and transformer settings,
+    indexed corpora by sha1 of the data files and the transformer vocabulary,
+    so changed data or vocabulary is transformed again.
+
+    Attributes:
+        directory: path of the cache directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def data_key(self, filenames):
+        key = hashlib.sha1()
+        for filename in _shard_files(filenames):
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    key.update(block)
+        return key
+
+    def vocab_key(self, p):
+        key = hashlib.sha1(repr((p._use_char, p._word_vocab._lower, p._char_vocab._lower)).encode())
+        for vocab in (p._word_vocab, p._char_vocab, p._label_vocab):
+            key.update('\0'.join(vocab._id2token).encode('utf-8'))
+            key.update(b'\1')
+        return key.hexdigest()
+
+    def load_transformer(self, filenames, initial_vocab=None, use_char=True):
+        """Returns `IndexTransformer` fitted on sentences of TSV files."""
+        key = self.data_key(filenames)
+        key.update(repr((use_char, initial_vocab)).encode('utf-8'))
+        cache_file = os.path.join(self.directory, key.hexdigest() + '.transformer')
+        if os.path.exists(cache_file):
+            return IndexTransformer.load(cache_file)
+        corpus = TSVCorpus(filenames)
+        p = IndexTransformer(initial_vocab=initial_vocab, use_char=use_char)
+        p.fit(corpus.words(), corpus.tags())
+        #write to temporary file first, other processes may read the entry
+        write_file = tempfile.NamedTemporaryFile(delete=False, dir=self.directory, suffix='.tmp')
+        write_file.close()
+        p.save(write_file.name)
+        os.replace(write_file.name, cache_file)
+        return p
+
+    def load_corpus(self, filenames, p):
+        """Returns `IndexedCorpus` of sentences of TSV files mapped to ids by p."""
+        key = self.data_key(filenames)
+        key.update(self.vocab_key(p).encode())
+        corpus_dir = os.path.join(self.directory, key.hexdigest())
+        if os.path.exists(corpus_dir):
+            return IndexedCorpus(corpus_dir)
+        write_dir = tempfile.mkdtemp(dir=self.directory, suffix='.tmp')
+        try:
+            IndexedCorpus.write(write_dir, p, TSVCorpus(filenames))
+            os.rename(write_dir, corpus_dir)
+        except OSError:
+            #written by another process in the meantime
+            shutil.rmtree(write_dir, ignore_errors=True)
+            if not os.path.exists(corpus_dir):
+                raise
+        return IndexedCorpus(corpus_dir)
+
 
 if __name__ == "__main__":
     # model = Sequential([
@@ -229,7 +771,8 @@ if __name__ == "__main__":
         if len(x_train[i]) and len(y_train[i]):
             X_train.append(x_train[i])
             Y_train.append(y_train[i])
-    model.fit(X_train[:1000], Y_train[:1000], batch_size=1, epochs=20, shuffle=False)
+    # sentences of similar length are batched together, so batches are not padded much
+    model.fit(X_train[:1000], Y_train[:1000], batch_size=32, epochs=20, bucketed=True)
 
     # test
     score = model.score(X_train[1000:2000], Y_train[1000:2000])
@@ -1,6 +1,9 @@
+import argparse
 import functools
 import os
+import sys
 import tempfile
+import time
 
 from six import string_types
 
@@ -10,18 +13,10 @@ import re
 import numpy as np
 import pickle
 
-def _parse_args(fun):
-    """
-    Wraps function arguments:
-    if fileids not specified then function set NKJPCorpusReader paths.
-    """
-    @functools.wraps(fun)
-    def decorator(self, fileids=None, **kwargs):
-        if not fileids:
-            fileids = self._paths
-        return fun(self, fileids, **kwargs)
-
-    return decorator
+#document reading is shared with crf/nkjp_download.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crf'))
+from nkjp_documents import (NKJPCorpus_Cache, NKJPCorpus_Document, NKJPDocumentsMixin, XML_Stream,
+                            _parse_args)
 
 
 class NKJPCorpus_Text_View(XMLCorpusView):
@@ -36,12 +31,19 @@ class NKJPCorpus_Text_View(XMLCorpusView):
         self.mode = kwargs.pop('mode', 0)
         self.tagspec = '.*/div/ab'
         self.segm_dict = dict()
-        #xml preprocessing
-        self.xml_tool = XML_Tool(filename, 'text.xml')
-        #base class init
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        #preprocess=True goes through temporary file built by XML_Tool
+        self.preprocess = kwargs.pop('preprocess', False)
+        if self.preprocess:
+            #xml preprocessing
+            self.xml_tool = XML_Tool(filename, 'text.xml')
+            #base class init
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'text.xml')
 
     def handle_query(self):
+        if not self.preprocess:
+            return [' '.join([segm for segm in self.xml_stream.iterparse(self.tagspec, self.handle_elt)])]
         try:
             self._open()
             x = self.read_block(self._stream)
@@ -78,7 +80,7 @@ class NKJPCorpus_Text_View(XMLCorpusView):
         return elt.text
 
 
-class NKJPCorpusReader(XMLCorpusReader):
+class NKJPCorpusReader(NKJPDocumentsMixin, XMLCorpusReader):
     WORDS_MODE = 0
     NE_MODE = 1
     SENTS_MODE = 2
@@ -125,11 +127,11 @@ class NKJPCorpusReader(XMLCorpusReader):
         """
         mode = kwargs.pop('mode', NKJPCorpusReader.WORDS_MODE)
         if mode is NKJPCorpusReader.WORDS_MODE:
-            return NKJPCorpus_Words_View(filename)
+            return NKJPCorpus_Words_View(filename, **kwargs)
         elif mode is NKJPCorpusReader.NE_MODE:
-            return NKJPCorpus_Named_View(filename)
+            return NKJPCorpus_Named_View(filename, **kwargs)
         elif mode is NKJPCorpusReader.SENTS_MODE:
-            return NKJPCorpus_Segmentation_View(filename, tags=tags)
+            return NKJPCorpus_Segmentation_View(filename, tags=tags, **kwargs)
 
         else:
             raise NameError('No such mode!')
@@ -181,6 +183,16 @@ class NKJPCorpusReader(XMLCorpusReader):
                                   mode=NKJPCorpusReader.SENTS_MODE, **kwargs).handle_query()
                        for fileid in fileids])
 
+    @_parse_args
+    def iter_sents(self, fileids=None, **kwargs):
+        """
+        Yields sentences in specified fileids one by one.
+        """
+        for fileid in fileids:
+            for sentence in self._view(self.add_root(fileid),
+                                       mode=NKJPCorpusReader.SENTS_MODE, **kwargs).iter_query():
+                yield sentence
+
 
 class NKJPCorpus_Segmentation_View(XMLCorpusView):
     """
@@ -190,13 +202,18 @@ class NKJPCorpus_Segmentation_View(XMLCorpusView):
 
     def __init__(self, filename, **kwargs):
         self.tagspec = '.*p/.*s'
+        self.preprocess = kwargs.pop('preprocess', False)
         #intersperse NKJPCorpus_Text_View
-        self.text_view = NKJPCorpus_Text_View(filename, mode=NKJPCorpus_Text_View.SENTS_MODE)
+        self.text_view = NKJPCorpus_Text_View(filename, mode=NKJPCorpus_Text_View.SENTS_MODE,
+                                              preprocess=self.preprocess)
         self.text_view.handle_query()
-        #xml preprocessing
-        self.xml_tool = XML_Tool(filename, 'ann_segmentation.xml')
-        #base class init
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        if self.preprocess:
+            #xml preprocessing
+            self.xml_tool = XML_Tool(filename, 'ann_segmentation.xml')
+            #base class init
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'ann_segmentation.xml')
 
     def get_segm_id(self, example_word):
         return example_word.split('(')[1].split(',')[0]
@@ -232,7 +249,20 @@ class NKJPCorpus_Segmentation_View(XMLCorpusView):
 
         return ret
 
+    def iter_query(self):
+        """
+        Yields sentences one by one instead of returning the whole list.
+        """
+        if self.preprocess:
+            for sentence in self.handle_query():
+                yield sentence
+            return
+        for segm in self.xml_stream.iterparse(self.tagspec, self.handle_elt):
+            yield self.get_sentences(self.remove_choice(segm))
+
     def handle_query(self):
+        if not self.preprocess:
+            return list(self.iter_query())
         try:
             self._open()
             sentences = []
@@ -306,10 +336,29 @@ class NKJPCorpus_Words_View(XMLCorpusView):
 
     def __init__(self, filename, **kwargs):
         self.tagspec = '.*/seg/fs'
-        self.xml_tool = XML_Tool(filename, 'ann_words.xml')
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        #preprocess=True goes through temporary file built by XML_Tool
+        self.preprocess = kwargs.pop('preprocess', False)
+        if self.preprocess:
+            self.xml_tool = XML_Tool(filename, 'ann_words.xml')
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'ann_words.xml')
+
+    def iter_query(self):
+        """
+        Yields records one by one instead of returning the whole list.
+        """
+        if self.preprocess:
+            for part in self.handle_query():
+                yield part
+            return
+        for part in self.xml_stream.iterparse(self.tagspec, self.handle_elt):
+            if part is not None:
+                yield part
 
     def handle_query(self):
+        if not self.preprocess:
+            return list(self.iter_query())
         try:
             self._open()
             words = []
@@ -358,10 +407,29 @@ class NKJPCorpus_Named_View(XMLCorpusView):
 
     def __init__(self, filename, **kwargs):
         self.tagspec = '.*/seg/fs'
-        self.xml_tool = XML_Tool(filename, 'ann_named.xml')
-        XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        #preprocess=True goes through temporary file built by XML_Tool
+        self.preprocess = kwargs.pop('preprocess', False)
+        if self.preprocess:
+            self.xml_tool = XML_Tool(filename, 'ann_named.xml')
+            XMLCorpusView.__init__(self, self.xml_tool.build_preprocessed_file(), self.tagspec)
+        else:
+            self.xml_stream = XML_Stream(filename, 'ann_named.xml')
+
+    def iter_query(self):
+        """
+        Yields records one by one instead of returning the whole list.
+        """
+        if self.preprocess:
+            for part in self.handle_query():
+                yield part
+            return
+        for part in self.xml_stream.iterparse(self.tagspec, self.handle_elt):
+            if part is not None:
+                yield part
 
     def handle_query(self):
+        if not self.preprocess:
+            return list(self.iter_query())
         try:
             self._open()
             words = []
@@ -400,39 +468,92 @@ class NKJPCorpus_Named_View(XMLCorpusView):
         if is_not_interp:
             return (word, tag)
 
+class TSV_Writer():
+    """
+    Writes labelled documents in data.txt format: word<TAB>label lines,
+    sentences separated by an empty line. Sentence boundaries are given
+    by NKJPCorpus_Document.sents, lines are written in batches of buffer_lines.
+    """
+
+    def __init__(self, filename, buffer_lines=100000):
+        self.file = open(filename, 'w', encoding='utf-8')
+        self.buffer_lines = buffer_lines
+        self.buffer = []
+        self.tokens = 0
+        self.sentences = 0
+        self.start = time.perf_counter()
+
+    def write_document(self, word_data, sents):
+        """
+        Writes (word, label) list split into (begin, end) sentences.
+        Sentences without words (Interp only) are skipped.
+        """
+        for begin, end in sents:
+            if end > len(word_data):
+                raise IndexError('Sentence (%d, %d) outside of %d words' % (begin, end, len(word_data)))
+            if begin == end:
+                continue
+            self.buffer.extend([word + '\t' + label + '\n' for word, label in word_data[begin:end]])
+            self.buffer.append('\n')
+            self.tokens += end - begin
+            self.sentences += 1
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+        return "Tokens: %d, sentences: %d, %.0f tokens/s" % (
+            self.tokens, self.sentences, self.tokens / elapsed if elapsed else 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def label_document(document, scheme='BIO', outside='O'):
+    """
+    Returns (word, label) for every word of NKJPCorpus_Document and its sentence boundaries.
+    Labels come from named entity spans, see NKJPCorpus_Document.named_tags.
+    """
+    word_data = []
+    for (word, tag), label in zip(document.tagged_words(), document.named_tags(scheme, outside)):
+        word_data.append((word, label))
+    return word_data, document.sents
+
 if __name__ == "__main__":
-    x = NKJPCorpusReader(root='/home/dominik/Downloads/NKJP-PodkorpusMilionowy-1.2') # obtain the whole corpus
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='/home/dominik/Downloads/NKJP-PodkorpusMilionowy-1.2')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes reading documents')
+    parser.add_argument('--scheme', default='BIO', choices=NKJPCorpus_Document.SCHEMES,
+                        help='named entity tagging scheme')
+    parser.add_argument('--cache', help='directory with parsed documents reused between runs')
+    parser.add_argument('--clean-cache', action='store_true',
+                        help='remove cache entries of changed or removed documents and exit')
+    args = parser.parse_args()
+
+    x = NKJPCorpusReader(root=args.root) # obtain the whole corpus
+    cache = NKJPCorpus_Cache(args.cache) if args.cache else None
+    if args.clean_cache:
+        if cache is None:
+            parser.error('--clean-cache requires --cache')
+        print("Removed %d cache entries" % cache.clean(x._paths))
+        raise SystemExit
     fileids = x.fileids()
-    all_word_data = []
-    with open('data.txt', 'w') as words_object:
-        for fileid in fileids:
-            x = NKJPCorpusReader(root='/home/dominik/Downloads/NKJP-PodkorpusMilionowy-1.2', fileids=fileid.split("/")[0])
-            names = x.named_entities()
-            words = x.words()
-            fileid = '/' + fileid
-            sents = x.sents([fileid])
-            word_data = []
-            named_data = []
-            zero_length = 0
-            length = 0
-            print(fileid)
-            for named, name in names:
-                for val in re.split('\s+', named):
-                    named_data.append((val, name))
-            for word, tag in words:
-                label = next((name for ind, (named, name) in enumerate(named_data) if named == word), '0')
-                all_word_data.append((word, label))
-
-            for sent in sents:
-                length += len(sent.split(' '))
-                try:
-                    for i in range(zero_length, length-1):
-                        # print(words[i][0])
-                        words_object.write(words[i][0])
-                        words_object.write('\t')
-                        words_object.write(all_word_data[i][1])
-                        words_object.write('\n')
-                    words_object.write('\n')
-                    zero_length += len(sent.split(' '))
-                except IndexError:
-                    pass
+    handle_document = functools.partial(label_document, scheme=args.scheme)
+    with TSV_Writer('data.txt') as writer:
+        for fileid, (word_data, sents) in zip(fileids, x.map_documents(handle_document=handle_document,
+                                                                       workers=args.workers, cache=cache)):
+            print('/' + fileid)
+            writer.write_document(word_data, sents)
+    print(writer.stats())
+    if cache is not None:
+        print(cache.stats())